@@ -0,0 +1,37 @@
+"""Benchmark `column_stats` against the builtin min and max which it replaces.
+
+Run from the top-level directory with `poetry run python -m benchmarks.column_stats`.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd  # type: ignore
+
+from ways_py.ways import column_stats
+
+
+def main(rows: int = 10_000_000) -> None:
+    """Time the extent computations on a column of `rows` normally-distributed values."""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({'z': rng.normal(size=rows)})
+    ys = data['z']
+
+    builtin = min(timeit.repeat(lambda: (min(ys), max(ys)), number=1, repeat=3))
+    pandas = min(timeit.repeat(lambda: (ys.min(), ys.max()), number=1, repeat=3))
+    # a fresh DataFrame each time, sharing the column, so that nothing is cached
+    uncached = min(timeit.repeat(lambda: column_stats(pd.DataFrame({'z': ys}, copy=False), 'z'),
+                                 number=1, repeat=3))
+    column_stats(data, 'z')
+    cached = min(timeit.repeat(lambda: column_stats(data, 'z'), number=1, repeat=3))
+
+    print(f"{rows} rows")
+    print(f"builtin min/max:      {builtin:.4f}s")
+    print(f"Series.min/max:       {pandas:.4f}s")
+    print(f"column_stats:         {uncached:.4f}s ({builtin / uncached:.0f}x faster than builtin)")
+    print(f"column_stats, cached: {cached * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,56 @@
+"""Benchmark `ways_py.serialise.to_json` against Altair's `to_json` on decorated charts.
+
+Run from the top-level directory with `poetry run python -m benchmarks.serialise`.
+"""
+
+import sys
+import timeit
+from typing import Callable
+
+import altair as alt  # type: ignore
+from benchmarks.suite import categorical_data
+
+from ways_py.loaders import load_csv, load_geo
+from ways_py.serialise import to_json
+from ways_py.ways import AltairColorViz
+
+
+def choropleth() -> alt.Chart:
+    """Choropleth of the US states by Donald Trump's polling average on election day, as in the notebooks."""
+    states = load_geo('notebooks/gz_2010_us_040_00_500k.json')
+    polls = load_csv('notebooks/presidential_poll_averages_2020.csv',
+                     filters={'candidate_name': 'Donald Trump', 'modeldate': '11/03/2020'})
+    data = states.merge(polls.rename(columns={'state': 'NAME'}), on='NAME')
+    return alt.Chart(data) \
+        .mark_geoshape() \
+        .encode(alt.Color('pct_estimate', bin=alt.Bin(maxbins=20), scale=alt.Scale(type='band')),
+                tooltip=['NAME', 'pct_estimate']) \
+        .project(type='albersUsa')
+
+
+def compare(name: str, chart: alt.TopLevelMixin) -> None:
+    """Time both serialisations of `chart`."""
+    def time(f: Callable[[], str]) -> float:
+        return min(timeit.repeat(f, number=1, repeat=3))
+
+    altair = time(lambda: str(chart.to_json()))
+    fast = time(lambda: to_json(chart))
+    unvalidated = time(lambda: to_json(chart, validate=False))
+    print(f"{name}")
+    print(f"  Chart.to_json:               {altair:.4f}s")
+    print(f"  to_json:                     {fast:.4f}s ({altair / fast:.0f}x faster)")
+    print(f"  to_json, validate=False:     {unvalidated:.4f}s ({altair / unvalidated:.0f}x faster)")
+
+
+def main(rows: int = 100_000) -> None:
+    """Compare the serialisations on the choropleth example, and on a decorated scatterplot of `rows` rows."""
+    alt.data_transformers.disable_max_rows()
+    compare("choropleth", AltairColorViz.decorate(choropleth()))
+    scatterplot = alt.Chart(categorical_data(rows)) \
+        .mark_circle() \
+        .encode(x='x', y='y', color=alt.Color('z', bin=alt.Bin(maxbins=20)))
+    compare(f"scatterplot, {rows} rows", AltairColorViz.decorate(scatterplot))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
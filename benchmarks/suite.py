@@ -0,0 +1,225 @@
+"""Benchmark suite: time the meta-visualisations, serialisation and widget re-rendering across data sizes.
+
+Each benchmark is run on numeric (binned), categorical (non-binned integer codes) and GeoDataFrame inputs of
+each number of rows. The results are printed, and can be saved as JSON (`--output`) and compared with a
+baseline saved in the same way (`--baseline`), in which case any regressions are reported and the exit
+status is 1. Run from the top-level directory with, e.g.:
+
+    poetry run python -m benchmarks.suite --output
+    poetry run python -m benchmarks.suite --baseline
+
+Without a file name, both use `benchmarks/baseline.json` (`BASELINE`). Timings depend on the machine, so a
+baseline is not committed (the file is ignored by git): make one on the machine it is compared on, e.g. in
+CI by running the suite with `--output` on the base commit and then with `--baseline` on the change.
+
+Each timing is the fastest of `--repeat` calls, or of more calls for short timings (see `best`), to keep
+noise within the tolerance.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from unittest import mock
+
+import altair as alt  # type: ignore
+import geopandas as gpd  # type: ignore
+import numpy as np
+import pandas as pd  # type: ignore
+from shapely.geometry import box  # type: ignore
+
+from ways_py import ways
+from ways_py.serialise import to_json
+from ways_py.ways import AltairColorViz, AltairColorWidgets
+
+BASELINE = 'benchmarks/baseline.json'
+"""Where `--output` saves the results, and `--baseline` reads them, by default."""
+
+
+def numeric_data(rows: int) -> pd.DataFrame:
+    """Scatterplot data with a normally-distributed column to colour by."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'x': rng.random(rows), 'y': rng.random(rows), 'z': rng.normal(size=rows)})
+
+
+def categorical_data(rows: int) -> pd.DataFrame:
+    """Scatterplot data with a column of 50 integer categories to colour by."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'x': rng.random(rows), 'y': rng.random(rows), 'z': rng.integers(0, 50, rows)})
+
+
+def geo_data(rows: int) -> pd.DataFrame:
+    """A square grid of unit squares, with a normally-distributed column to colour by."""
+    rng = np.random.default_rng(0)
+    side = int(np.ceil(np.sqrt(rows)))
+    x, y = np.arange(rows) % side, np.arange(rows) // side
+    # one at a time, as the vectorised shapely.box needs Shapely 2
+    return gpd.GeoDataFrame({'z': rng.normal(size=rows)},
+                            geometry=[box(x0, y0, x0 + 1, y0 + 1) for x0, y0 in zip(x, y)])
+
+
+def chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+    """Chart of one of the inputs, coloured by `color`."""
+    if isinstance(data, gpd.GeoDataFrame):
+        return alt.Chart(data).mark_geoshape().encode(color=color)
+    return alt.Chart(data).mark_circle().encode(x='x', y='y', color=color)
+
+
+class Input(NamedTuple):
+    """A kind of input data, and how it is coloured."""
+
+    data: Callable[[int], pd.DataFrame]
+    bin: Any
+    max_rows: Optional[int] = None
+    """Largest number of rows of this input to benchmark (as it is slow to make)."""
+
+
+INPUTS = {
+    'numeric': Input(numeric_data, alt.Bin(maxbins=20)),
+    'categorical': Input(categorical_data, False),
+    'geo': Input(geo_data, alt.Bin(maxbins=20), max_rows=100_000),
+}
+
+
+class Result(NamedTuple):
+    """Timing (and, for serialisation, size) of one benchmark on one input."""
+
+    input: str
+    rows: int
+    benchmark: str
+    seconds: float
+    """Fastest of the repeats."""
+    bytes: Optional[int] = None
+
+
+def best(f: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """Fastest of at least `repeat` calls of `f`, and the result of the last call.
+
+    Short calls are repeated more, to take about `repeat` times 0.2s (as found by `timeit.Timer.autorange`,
+    which also warms up), since the fastest of only a few of them is still at the mercy of noise.
+    """
+    result = []
+    timer = timeit.Timer(lambda: result.append(f()))
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(number=1, repeat=number * repeat))
+    return seconds, result[-1]
+
+
+def widget_rerender(data: pd.DataFrame, input: Input, repeat: int) -> float:
+    """Fastest time for the widgets to re-render the decorated chart after the 'Max Bins' widget changes."""
+    def make_chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+        return AltairColorViz.decorate(chart(data, color))
+
+    widgets = AltairColorWidgets()
+    with mock.patch.object(ways, 'display'):
+        # no cache, so that every change re-renders
+        widgets.display(data, 'z', make_chart, debounce=0, cache_size=0)
+        widgets.bin.value = 'Binned' if input.bin else 'Continuous'
+        # between 7 and 8 bins, so that every call does the same work
+        seconds, _ = best(lambda: setattr(widgets.maxbins, 'value', 15 - widgets.maxbins.value), repeat)
+    return seconds
+
+
+def run(name: str, rows: int, repeat: int, max_embed_rows: int) -> List[Result]:
+    """Run every benchmark on the input `name` with `rows` rows.
+
+    Benchmarks which embed all of the data in a spec are skipped above `max_embed_rows` rows.
+    """
+    input = INPUTS[name]
+    data = input.data(rows)
+
+    # a new chart each time, since serialising a chart modifies its encodings
+    def src() -> alt.Chart:
+        return chart(data, alt.Color('z', bin=input.bin))
+
+    results = []
+
+    def add(benchmark: str, f: Callable[[], Any], size: Optional[Callable[[Any], int]] = None) -> None:
+        seconds, result = best(f, repeat)
+        results.append(Result(name, rows, benchmark, seconds, size(result) if size else None))
+
+    for precompute in [False, True]:
+        suffix = '[precompute]' if precompute else ''
+        add('density_chart' + suffix, lambda: AltairColorViz.density_chart(src(), precompute=precompute))
+        add('used_colours' + suffix, lambda: AltairColorViz.used_colours(src(), precompute=precompute))
+        add('decorate' + suffix, lambda: AltairColorViz.decorate(src(), precompute=precompute))
+        if rows <= max_embed_rows:
+            add('to_json' + suffix, lambda: to_json(AltairColorViz.decorate(src(), precompute=precompute)),
+                size=lambda spec: len(spec.encode()))
+    add('get_altair_color_obj', lambda: AltairColorWidgets().get_altair_color_obj(data, 'z'))
+    if rows <= max_embed_rows:
+        results.append(Result(name, rows, 'widget_rerender', widget_rerender(data, input, repeat)))
+    return results
+
+
+def regressions(results: Sequence[Result], baseline: Sequence[Result], tolerance: float,
+                min_seconds: float = 0.005) -> List[str]:
+    """Descriptions of the results which are slower (or bigger) than their baselines.
+
+    A timing regresses if it is more than `tolerance` times its baseline, and slower by more than
+    `min_seconds` (to ignore noise in very short timings). A size regresses if it is at all larger.
+    """
+    baselines = {(r.input, r.rows, r.benchmark): r for r in baseline}
+    found = []
+    for r in results:
+        b = baselines.get((r.input, r.rows, r.benchmark))
+        if b is None:
+            continue
+        if r.seconds > b.seconds * tolerance and r.seconds - b.seconds > min_seconds:
+            found.append(f"{r.input}, {r.rows} rows, {r.benchmark}: {b.seconds:.4f}s -> {r.seconds:.4f}s")
+        if r.bytes is not None and b.bytes is not None and r.bytes > b.bytes:
+            found.append(f"{r.input}, {r.rows} rows, {r.benchmark}: {b.bytes} -> {r.bytes} bytes")
+    return found
+
+
+def environment() -> Dict[str, str]:
+    """Versions of the things which (other than ways_py) the timings depend on."""
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'altair': alt.__version__, 'pandas': pd.__version__, 'numpy': np.__version__}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the suite, returning the exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--inputs', nargs='+', choices=list(INPUTS), default=list(INPUTS))
+    parser.add_argument('--repeat', type=int, default=5, help="least number of calls to take the fastest of")
+    parser.add_argument('--max-embed-rows', type=int, default=1_000_000,
+                        help="skip benchmarks which embed all the data above this many rows")
+    parser.add_argument('--output', nargs='?', const=BASELINE, help="file to save the results to, as JSON")
+    parser.add_argument('--baseline', nargs='?', const=BASELINE,
+                        help="results (saved with --output) to compare with")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="ratio to the baseline above which a timing is a regression")
+    args = parser.parse_args(argv)
+
+    alt.data_transformers.disable_max_rows()
+    results: List[Result] = []
+    for name in args.inputs:
+        for rows in args.rows:
+            if INPUTS[name].max_rows is not None and rows > INPUTS[name].max_rows:
+                continue
+            for r in run(name, rows, args.repeat, args.max_embed_rows):
+                size = '' if r.bytes is None else f" {r.bytes:>14,} bytes"
+                print(f"{r.input:<12} {r.rows:>10} {r.benchmark:<26} {r.seconds:>10.4f}s{size}", flush=True)
+                results.append(r)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': [r._asdict() for r in results]}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = [Result(**r) for r in json.load(f)['results']]
+        found = regressions(results, baseline, args.tolerance)
+        print(f"\n{len(found)} regressions against {args.baseline}")
+        for regression in found:
+            print("  " + regression)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,18 @@
 # This script generates the data to be loaded by usa-presidential-poll.ipynb
-import geopandas as gpd 
-import pandas as pd
+from ways_py.loaders import load_csv, load_geo
 
-def get_choropleth_data():
+def get_choropleth_data(candidates=('Donald Trump', 'Joseph R. Biden Jr.'), modeldate=None):
     # Here we load two data files, the first is a geometry dataset for the USA by states
     # and the second is polling for candidates in the 2020 presendential election, also by states.
-    geo_states = gpd.read_file('gz_2010_us_040_00_500k.json')
-    df_polls = pd.read_csv('presidential_poll_averages_2020.csv')
+    # Each is parsed only the first time, and afterwards loaded from a cached columnar copy.
+    geo_states = load_geo('gz_2010_us_040_00_500k.json')
 
-    # Filter our poll data to remove third party candidates:
-    trump_biden_data = df_polls[
-        df_polls['candidate_name'].isin(['Donald Trump', 'Joseph R. Biden Jr.'])
-    ]
+    # Filter our poll data to remove third party candidates (and, optionally, to a single date),
+    # before converting it to pandas and joining it to the geometry:
+    filters = {'candidate_name': list(candidates)}
+    if modeldate is not None:
+        filters['modeldate'] = modeldate
+    trump_biden_data = load_csv('presidential_poll_averages_2020.csv', filters=filters)
 
     # Our spatial and poll data have the name of the state in common.
     # We will change the name of the state to NAME to match our geospatial dataframe.
@@ -19,5 +20,3 @@ def get_choropleth_data():
 
     # We can join the geospatial and poll data using the NAME column (the name of the state).
     return geo_states.merge(trump_biden_data, on='NAME')
-
- 
\ No newline at end of file
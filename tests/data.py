@@ -0,0 +1,66 @@
+"""Datasets and example charts shared by the tests and benchmarks."""
+
+from typing import Any, List, Optional
+
+import altair as alt  # type: ignore
+import numpy as np
+import pandas as pd  # type: ignore
+
+from ways_py.loaders import load_csv, load_geo
+from ways_py.testing import cached
+from ways_py.ways import altair_color_viz
+
+
+def choropleth_data() -> Any:
+    """Dataset for choropleth example."""
+    geo_states = load_geo('notebooks/gz_2010_us_040_00_500k.json')
+    # filtered before the join, rather than after
+    trump_data = load_csv('notebooks/presidential_poll_averages_2020.csv',
+                          filters={'candidate_name': 'Donald Trump', 'modeldate': '11/03/2020'})
+    trump_data.columns = [
+        'cycle', 'NAME', 'modeldate', 'candidate_name', 'pct_estimate', 'pct_trend_adjusted'
+    ]
+    return geo_states.merge(trump_data, on='NAME')
+
+
+@altair_color_viz
+def example_choropleth(candidate_states: pd.DataFrame, title: str, extent: Optional[List[int]]) -> alt.Chart:
+    """Choropleth of the US states with the candidate vote percentage mapped to color."""
+    color = alt.Color(shorthand='pct_estimate', bin=alt.Bin(maxbins=20), scale=alt.Scale(type='band'))
+    chart = alt.Chart(candidate_states, title=title) \
+        .mark_geoshape() \
+        .encode(color, tooltip=['NAME', 'pct_estimate']) \
+        .properties(width=500, height=300) \
+        .project(type='albersUsa')
+
+    if extent is not None:
+        chart.encoding.color.bin.extent = extent
+
+    return chart
+
+
+def scatterplot_data() -> Any:
+    """Data on movies from IMDB and Rotten Tomatoes."""
+    from vega_datasets import data  # type: ignore
+    import ssl
+    ssl._create_default_https_context = ssl._create_unverified_context
+    return pd.read_json(cached(data.movies.url))
+
+
+@altair_color_viz
+def example_scatterplot(data: pd.DataFrame, color: alt.Color, title: str) -> alt.Chart:
+    """Scatterplot of IMdB ratings vs. Rotten Tomatoes by budget."""
+    chart = alt.Chart(data, title=title) \
+        .mark_circle() \
+        .encode(x='IMDB_Rating', y='Rotten_Tomatoes_Rating', color=color)
+    return chart
+
+
+def synthetic_data(rows: int) -> pd.DataFrame:
+    """Scatterplot data with a low-cardinality integer column to colour by."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'x': rng.random(rows),
+        'y': rng.random(rows),
+        'z': rng.integers(0, 50, rows)
+    })
@@ -0,0 +1,95 @@
+"""Test module for ways_py.batch."""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import altair as alt  # type: ignore
+from altair_saver import SeleniumSaver  # type: ignore
+import pytest
+from tests.data import synthetic_data
+
+from ways_py.batch import render_batch
+from ways_py.ways import altair_color_viz
+
+
+@altair_color_viz
+def example_chart(rows: int, maxbins: int) -> alt.Chart:
+    """Decorated scatterplot of synthetic data."""
+    return alt.Chart(synthetic_data(rows)) \
+        .mark_circle() \
+        .encode(x='x', y='y', color=alt.Color('z', bin=alt.Bin(maxbins=maxbins)))
+
+
+class VlConvertRenderer:
+    """Renderer which needs no browser, for testing."""
+
+    def __init__(self) -> None:
+        self.vlc = pytest.importorskip("vl_convert")
+        self.renders = 0
+
+    def render(self, spec: Dict[str, Any], fmt: str) -> Union[str, bytes]:
+        self.renders += 1
+        if fmt == 'png':
+            return bytes(self.vlc.vegalite_to_png(spec))
+        return str(self.vlc.vegalite_to_svg(spec))
+
+
+class TestRenderBatch:
+    """Test render_batch."""
+
+    @staticmethod
+    @pytest.mark.parametrize("processes", [0, 2])
+    def test_render_batch(tmp_path: Path, processes: int) -> None:
+        renderer = VlConvertRenderer()
+        params = [{'rows': rows, 'maxbins': maxbins} for rows in [100, 200] for maxbins in [10, 20]]
+        results = list(render_batch(example_chart, params, str(tmp_path / "{rows}" / "{maxbins}.svg"),
+                                    processes=processes, renderer=renderer))
+        assert sorted([result.params for result in results], key=str) == sorted(params, key=str)
+        assert renderer.renders == len(params)
+        for result in results:
+            assert result.error is None
+            assert result.build_seconds > 0 and result.render_seconds > 0
+            with open(result.path) as f:
+                assert f.read().startswith('<svg')
+
+    @staticmethod
+    def test_formats(tmp_path: Path) -> None:
+        renderer = VlConvertRenderer()
+        json_path, png_path, txt_path = (str(tmp_path / f"chart.{ext}") for ext in ['json', 'png', 'txt'])
+        for path in [json_path, png_path, txt_path]:
+            [result] = render_batch(example_chart, [{'rows': 100, 'maxbins': 10}], path, processes=0,
+                                    renderer=renderer)
+            if path == txt_path:
+                assert isinstance(result.error, ValueError)
+                assert not os.path.exists(path)
+            else:
+                assert result.error is None
+        with open(json_path) as f:
+            assert len(json.load(f)['hconcat']) == 3
+        with open(png_path, 'rb') as f:
+            assert f.read(4) == b'\x89PNG'
+        assert renderer.renders == 1
+
+    @staticmethod
+    def test_error(tmp_path: Path) -> None:
+        params: List[Dict[str, Any]] = [{'rows': 100, 'maxbins': 10}, {'rows': 100, 'maxbins': 'many'}]
+        results = list(render_batch(example_chart, params, str(tmp_path / "{maxbins}.json"), processes=2,
+                                    renderer=VlConvertRenderer()))
+        errors = [result for result in results if result.error is not None]
+        assert [result.params for result in errors] == [params[1]]
+        assert os.path.exists(tmp_path / "10.json")
+
+    @staticmethod
+    @pytest.mark.skipif(not SeleniumSaver.enabled(), reason="no web driver (chromedriver or geckodriver)")
+    def test_selenium(tmp_path: Path) -> None:
+        # the default renderer, which relies on altair_saver's internals (hence its pinned version)
+        params = [{'rows': 100, 'maxbins': 10, 'ext': 'svg'}, {'rows': 100, 'maxbins': 20, 'ext': 'png'}]
+        results = list(render_batch(lambda ext, **p: example_chart(**p), params,
+                                    str(tmp_path / "{maxbins}.{ext}"), processes=0))
+        assert [result.error for result in results] == [None, None]
+        with open(tmp_path / "10.svg") as f:
+            assert f.read().startswith('<svg')
+        with open(tmp_path / "20.png", 'rb') as f:
+            assert f.read(4) == b'\x89PNG'
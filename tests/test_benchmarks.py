@@ -0,0 +1,41 @@
+"""Test module for the benchmark suite."""
+
+from benchmarks.suite import regressions, Result
+
+
+class TestRegressions:
+    """Test the comparison of benchmark results with a baseline."""
+
+    @staticmethod
+    def test_regressions() -> None:
+        baseline = [
+            Result('numeric', 1000, 'decorate', 0.100),
+            Result('numeric', 1000, 'used_colours', 0.100),
+            Result('numeric', 1000, 'density_chart', 0.001),
+            Result('numeric', 1000, 'to_json', 0.100, 5000),
+            Result('geo', 1000, 'to_json', 0.100, 5000),
+        ]
+        results = [
+            # slower than the tolerance allows
+            Result('numeric', 1000, 'decorate', 0.200),
+            # slower, but within the tolerance
+            Result('numeric', 1000, 'used_colours', 0.140),
+            # 3x slower, but by too little time to tell from noise
+            Result('numeric', 1000, 'density_chart', 0.003),
+            # as fast, but bigger
+            Result('numeric', 1000, 'to_json', 0.100, 5001),
+            # faster and smaller
+            Result('geo', 1000, 'to_json', 0.050, 4000),
+            # not in the baseline
+            Result('numeric', 10_000, 'decorate', 10.0),
+        ]
+        assert regressions(results, baseline, tolerance=1.5) == [
+            "numeric, 1000 rows, decorate: 0.1000s -> 0.2000s",
+            "numeric, 1000 rows, to_json: 5000 -> 5001 bytes",
+        ]
+        assert regressions(results, baseline, tolerance=1.5, min_seconds=0.001) == [
+            "numeric, 1000 rows, decorate: 0.1000s -> 0.2000s",
+            "numeric, 1000 rows, density_chart: 0.0010s -> 0.0030s",
+            "numeric, 1000 rows, to_json: 5000 -> 5001 bytes",
+        ]
+        assert regressions(results, results, tolerance=1.0) == []
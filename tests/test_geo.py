@@ -0,0 +1,133 @@
+"""Test module for ways_py.geo."""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import altair as alt  # type: ignore
+import geopandas as gpd  # type: ignore
+import numpy as np
+import pandas as pd  # type: ignore
+from shapely.geometry import MultiPolygon, Polygon  # type: ignore
+from tests.data import choropleth_data, example_choropleth
+
+from ways_py.geo import geometry_lookup, geoshape_lookup, pixel_tolerance, topojson
+from ways_py.ways import AltairColorViz
+
+
+def decode(topology: Dict[str, Any]) -> Dict[Any, Any]:
+    """Shapely geometries of a TopoJSON topology (as from `topojson`), by id."""
+    transform = topology['transform']
+    arcs = [np.cumsum(arc, axis=0) * transform['scale'] + transform['translate'] for arc in topology['arcs']]
+
+    def ring(indices: List[int]) -> List[Any]:
+        points: List[Any] = []
+        for i in indices:
+            arc = arcs[i] if i >= 0 else arcs[~i][::-1]
+            points.extend(arc if not points else arc[1:])
+        return points
+
+    def polygon(rings: List[List[int]]) -> Polygon:
+        return Polygon(ring(rings[0]), [ring(hole) for hole in rings[1:]])
+
+    geometries = {}
+    for geometry in topology['objects']['features']['geometries']:
+        if geometry['type'] == 'Polygon':
+            geometries[geometry['id']] = polygon(geometry['arcs'])
+        elif geometry['type'] == 'MultiPolygon':
+            geometries[geometry['id']] = MultiPolygon([polygon(rings) for rings in geometry['arcs']])
+    return geometries
+
+
+def squares() -> gpd.GeoDataFrame:
+    """Two adjacent unit squares, the second with a hole."""
+    return gpd.GeoDataFrame({
+        'name': ['a', 'b'],
+        'geometry': [
+            Polygon([(0, 0), (0, 1), (1, 1), (1, 0)]),
+            Polygon([(1, 0), (1, 1), (2, 1), (2, 0)],
+                    [[(1.25, 0.25), (1.75, 0.25), (1.75, 0.75), (1.25, 0.75)]])
+        ]
+    })
+
+
+class TestTopoJSON:
+    """Test conversion of GeoDataFrames to TopoJSON."""
+
+    @staticmethod
+    def test_pixel_tolerance() -> None:
+        assert pixel_tolerance((0, 0, 100, 10), 500, 300) == 0.2
+        assert pixel_tolerance((0, 0, 10, 90), 500, 300, pixels=2) == 0.6
+
+    @staticmethod
+    def test_shared_arcs() -> None:
+        data = squares()
+        topology = topojson(data, 'name', quantization=201)
+        # the shared edge is stored once; each square has one other arc, and the hole is a single arc
+        assert len(topology['arcs']) == 4
+        geometries = decode(topology)
+        for name, geom in zip(data.name, data.geometry):
+            assert geometries[name].equals(geom)
+
+    @staticmethod
+    def test_choropleth() -> None:
+        data = choropleth_data()
+        topology = topojson(data, 'NAME')
+        geometries = decode(topology)
+        assert len(geometries) == len(data)
+        # quantising moves each point by less than the grid step
+        step = topology['transform']['scale'][0]
+        for name, geom in zip(data.NAME, data.geometry):
+            assert geometries[name].buffer(0).symmetric_difference(geom).area < geom.length * step
+
+    @staticmethod
+    def test_simplified() -> None:
+        data = choropleth_data()
+        full = topojson(data, 'NAME')
+        tolerance = pixel_tolerance((-125, 24, -66, 50), 500, 300)
+        simplified = topojson(data, 'NAME', tolerance=tolerance)
+        assert len(json.dumps(simplified)) < len(json.dumps(full)) / 5
+        # simplifying moves each border by less than the tolerance
+        geometries = decode(simplified)
+        for name, geom in zip(data.NAME, data.geometry):
+            assert geometries[name].buffer(0).symmetric_difference(geom).area < geom.length * tolerance
+
+
+class TestGeometryLookup:
+    """Test choropleths whose geometries are looked up by key."""
+
+    @staticmethod
+    def example_chart(attributes: Any, geo_data: Any) -> alt.Chart:
+        color = alt.Color(shorthand='pct_estimate', bin=alt.Bin(maxbins=20), scale=alt.Scale(type='band'))
+        return geoshape_lookup(alt.Chart(attributes), 'NAME', geo_data) \
+            .encode(color, tooltip=['NAME', 'pct_estimate']) \
+            .properties(width=500, height=300) \
+            .project(type='albersUsa')
+
+    @staticmethod
+    def test_geometry_once() -> None:
+        data = choropleth_data()
+        # the same geometries for each of several dates
+        data = pd.concat([data, data.assign(modeldate='11/02/2020'), data.assign(modeldate='11/01/2020')])
+        attributes, geo_data = geometry_lookup(data, 'NAME', 500, 300, bounds=(-125, 24, -66, 50))
+        assert 'geometry' not in attributes.columns
+        assert len(attributes) == len(data)
+        assert len(geo_data.values['objects']['features']['geometries']) == data.NAME.nunique()
+
+    @staticmethod
+    def test_decorated_size() -> None:
+        data = choropleth_data()
+        attributes, geo_data = geometry_lookup(data, 'NAME', 500, 300, bounds=(-125, 24, -66, 50))
+        spec = AltairColorViz.decorate(TestGeometryLookup.example_chart(attributes, geo_data)).to_dict()
+        topologies = [values for values in spec['datasets'].values() if isinstance(values, dict)]
+        assert len(topologies) == 1
+        expected = example_choropleth(data, 'test_decorated_size', None).to_dict()
+        assert len(json.dumps(spec)) < len(json.dumps(expected)) / 10
+
+    @staticmethod
+    def test_filename(tmp_path: Path) -> None:
+        filename = str(tmp_path / 'states.topojson')
+        _, geo_data = geometry_lookup(choropleth_data(), 'NAME', 500, 300, filename=filename)
+        assert geo_data.url == filename
+        with open(filename) as f:
+            assert json.load(f)['type'] == 'Topology'
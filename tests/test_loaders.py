@@ -0,0 +1,87 @@
+"""Test module for ways_py.loaders."""
+
+import os
+from pathlib import Path
+
+import geopandas as gpd  # type: ignore
+import pandas as pd  # type: ignore
+import pytest
+from tests.data import choropleth_data
+
+from ways_py.loaders import load_csv, load_geo
+
+pytest.importorskip("pyarrow")
+
+
+def write_csv(path: Path, rows: int) -> str:
+    """A CSV file of `rows` rows, with string and numeric columns."""
+    pd.DataFrame({
+        'name': [f'row {n % 3}' for n in range(rows)],
+        'n': range(rows),
+        'x': [n / 2 for n in range(rows)]
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+class TestLoadCsv:
+    """Test loading CSV files through a cached copy."""
+
+    @staticmethod
+    def test_cached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        source = write_csv(tmp_path / "data.csv", 10)
+        cache = str(tmp_path / "cache")
+        data = load_csv(source, directory=cache)
+        pd.testing.assert_frame_equal(data, pd.read_csv(source))
+        assert len(os.listdir(cache)) == 1
+
+        def read_csv(*args: object, **kwargs: object) -> None:
+            raise AssertionError("source parsed again")
+        monkeypatch.setattr(pd, 'read_csv', read_csv)
+        pd.testing.assert_frame_equal(load_csv(source, directory=cache), data)
+
+    @staticmethod
+    def test_invalidated(tmp_path: Path) -> None:
+        source = write_csv(tmp_path / "data.csv", 10)
+        cache = str(tmp_path / "cache")
+        load_csv(source, directory=cache)
+        [copy] = os.listdir(cache)
+        write_csv(tmp_path / "data.csv", 20)
+        assert len(load_csv(source, directory=cache)) == 20
+        # the copy of the earlier version replaced
+        assert len(os.listdir(cache)) == 1 and os.listdir(cache) != [copy]
+
+    @staticmethod
+    def test_filters(tmp_path: Path) -> None:
+        source = write_csv(tmp_path / "data.csv", 100)
+        expected = pd.read_csv(source)
+        expected = expected[expected.name.isin(['row 0', 'row 2']) & (expected.n < 50)].reset_index(drop=True)
+        data = load_csv(source, filters={'name': ['row 0', 'row 2'], 'n': list(range(50))},
+                        directory=str(tmp_path / "cache"))
+        pd.testing.assert_frame_equal(data, expected)
+        data = load_csv(source, filters={'name': 'row 1'}, columns=['x'], directory=str(tmp_path / "cache"))
+        assert list(data.columns) == ['x'] and len(data) == 33
+
+
+class TestLoadGeo:
+    """Test loading geographic data through a cached copy."""
+
+    @staticmethod
+    def test_geojson(tmp_path: Path) -> None:
+        source = 'notebooks/gz_2010_us_040_00_500k.json'
+        data = load_geo(source, directory=str(tmp_path))
+        expected = gpd.read_file(source)
+        assert data.equals(expected) and data.crs == expected.crs
+        assert load_geo(source, directory=str(tmp_path)).equals(expected)
+
+    @staticmethod
+    def test_choropleth_data() -> None:
+        # as when joined before filtering
+        geo_states = gpd.read_file('notebooks/gz_2010_us_040_00_500k.json')
+        df_polls = pd.read_csv('notebooks/presidential_poll_averages_2020.csv')
+        df_polls.columns = [
+            'cycle', 'NAME', 'modeldate', 'candidate_name', 'pct_estimate', 'pct_trend_adjusted'
+        ]
+        expected = geo_states.merge(df_polls, on='NAME')
+        expected = expected[expected.candidate_name == 'Donald Trump']
+        expected = expected[expected.modeldate == '11/03/2020']
+        assert choropleth_data().equals(expected.reset_index(drop=True))
@@ -0,0 +1,106 @@
+"""Test module for ways_py.serialise."""
+
+import json
+from typing import Any, Dict
+
+import altair as alt  # type: ignore
+import pandas as pd  # type: ignore
+import pytest
+from tests.data import choropleth_data, example_choropleth, synthetic_data
+
+from ways_py import serialise
+from ways_py.serialise import records_json, to_json
+from ways_py.ways import AltairColorViz
+
+
+def inline_datasets(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Spec with references to named datasets replaced by the data itself, so that specs can be compared."""
+    datasets = spec.get('datasets', {})
+
+    def inline(obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if list(obj) == ['name'] and obj['name'] in datasets:
+                return {'values': datasets[obj['name']]}
+            return {key: inline(value) for key, value in obj.items() if key != 'datasets'}
+        if isinstance(obj, list):
+            return [inline(value) for value in obj]
+        return obj
+    return dict(inline(spec))
+
+
+def example_chart(rows: int) -> alt.Chart:
+    """Scatterplot of synthetic data."""
+    return alt.Chart(synthetic_data(rows)) \
+        .mark_circle() \
+        .encode(x='x', y='y', color=alt.Color('z', bin=alt.Bin(maxbins=20)))
+
+
+class TestSerialise:
+    """Test the fast serialisation path against Altair's own."""
+
+    @staticmethod
+    def test_records_json() -> None:
+        data = pd.DataFrame({
+            'a': [1.5, None],
+            'b': ['x', None],
+            'c': pd.to_datetime(['2020-11-03', None])
+        })
+        records = json.loads(records_json(data))
+        assert records == [
+            {'a': 1.5, 'b': 'x', 'c': '2020-11-03T00:00:00.000'},
+            {'a': None, 'b': None, 'c': None}
+        ]
+
+    @staticmethod
+    def test_records_json_precision() -> None:
+        data = pd.DataFrame({'a': [0.1 + 0.2, 1e-7 / 3, 2e10 / 3, -0.0, float('inf')], 'b': range(5)})
+        assert json.loads(records_json(data)) == alt.to_values(data)['values']
+
+    @staticmethod
+    def test_choropleth() -> None:
+        chart = example_choropleth(choropleth_data(), 'test_choropleth', None)
+        expected = inline_datasets(json.loads(chart.to_json()))
+        spec = json.loads(to_json(chart))
+        assert len(spec['datasets']) == 1
+        assert inline_datasets(spec) == expected
+
+    @staticmethod
+    def test_decorated() -> None:
+        chart = AltairColorViz.decorate(example_chart(1000))
+        expected = inline_datasets(json.loads(example_chart(1000).to_json()))
+        spec = json.loads(to_json(chart))
+        assert len(spec['datasets']) == 1
+        altair_spec = json.loads(AltairColorViz.decorate(example_chart(1000)).to_json())
+        assert inline_datasets(spec) == inline_datasets(altair_spec)
+        assert list(spec['datasets'].values()) == [expected['data']['values']]
+
+    @staticmethod
+    def test_url_data() -> None:
+        chart = alt.Chart('data.csv').mark_circle().encode(x='x:Q', y='y:Q')
+        # no (empty) datasets
+        assert json.loads(to_json(chart)) == json.loads(chart.to_json())
+
+    @staticmethod
+    def test_validate_once(monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(serialise, '_validated', set())
+        validated = []
+        validate = classmethod(lambda cls, spec: validated.append(spec))
+        monkeypatch.setattr(alt.HConcatChart, 'validate', validate)
+        to_json(AltairColorViz.decorate(example_chart(100)))
+        to_json(AltairColorViz.decorate(example_chart(100)))
+        assert len(validated) == 1
+        # the same spec with different data
+        chart = example_chart(100)
+        chart.data = chart.data.sample(frac=1, random_state=0)
+        to_json(AltairColorViz.decorate(chart))
+        assert len(validated) == 1
+        to_json(AltairColorViz.decorate(example_chart(200)), validate=False)
+        assert len(validated) == 1
+
+    @staticmethod
+    def test_invalid() -> None:
+        chart = example_chart(100)
+        chart.width = 'wide'
+        with pytest.raises(Exception):
+            to_json(chart)
+        to_json(chart, validate=False)
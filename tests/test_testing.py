@@ -0,0 +1,102 @@
+"""Test module for ways_py.testing."""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+import altair as alt  # type: ignore
+import pytest
+from tests.data import synthetic_data
+
+from ways_py import testing
+from ways_py.serialise import to_json
+from ways_py.testing import cached, expect_fig, spec_hash
+
+
+def example_chart(rows: int = 10) -> alt.Chart:
+    """Scatterplot of synthetic data."""
+    return alt.Chart(synthetic_data(rows)).mark_circle().encode(x='x', y='y')
+
+
+@pytest.fixture()
+def renders(monkeypatch: pytest.MonkeyPatch) -> List[Dict[str, Any]]:
+    """Capture the specs rendered by expect_fig, rendering each as a fake SVG."""
+    specs: List[Dict[str, Any]] = []
+
+    def render_svg(spec: Dict[str, Any]) -> str:
+        specs.append(spec)
+        return f'<svg>{spec_hash(spec)}</svg>'
+    monkeypatch.setattr(testing, 'render_svg', render_svg)
+    return specs
+
+
+class TestSpecHash:
+    """Test spec_hash."""
+
+    @staticmethod
+    def test_dataset_names() -> None:
+        spec = json.loads(to_json(example_chart()))
+        [name] = spec['datasets']
+        renamed = json.loads(json.dumps(spec, indent=2).replace(name, 'data-other'))
+        assert spec_hash(spec) == spec_hash(renamed)
+
+    @staticmethod
+    def test_data_changed() -> None:
+        assert spec_hash(json.loads(to_json(example_chart(10)))) != \
+            spec_hash(json.loads(to_json(example_chart(11))))
+
+
+class TestExpectFig:
+    """Test expect_fig, with rendering faked."""
+
+    @staticmethod
+    def test_unchanged_not_rendered(tmp_path: Path, renders: List[Dict[str, Any]]) -> None:
+        filename = str(tmp_path / "chart")
+        with pytest.raises(AssertionError, match="image not found"):
+            expect_fig(example_chart(), filename, True)
+        assert len(renders) == 1
+        os.replace(filename + '.new.json', filename + '.json')
+        os.replace(filename + '.new.svg', filename + '.svg')
+        # an equivalent spec, serialised differently
+        with open(filename + '.json') as f:
+            spec = json.load(f)
+        with open(filename + '.json', 'w') as f:
+            json.dump(dict(reversed(spec.items())), f)
+        expect_fig(example_chart(), filename, True)
+        assert len(renders) == 1
+        assert sorted(os.listdir(tmp_path)) == ['chart.json', 'chart.svg']
+
+    @staticmethod
+    def test_changed(tmp_path: Path, renders: List[Dict[str, Any]]) -> None:
+        filename = str(tmp_path / "chart")
+        with open(filename + '.json', 'w') as f:
+            f.write(to_json(example_chart(11)))
+        with open(filename + '.svg', 'w') as f:
+            f.write(testing.render_svg(json.loads(to_json(example_chart()))))
+        # spec changed, but image identical: the spec baseline is updated
+        expect_fig(example_chart(), filename, True)
+        assert len(renders) == 2
+        with open(filename + '.json') as f:
+            assert spec_hash(json.load(f)) == spec_hash(json.loads(to_json(example_chart())))
+        # image changed
+        with pytest.raises(AssertionError, match="image changed"):
+            expect_fig(example_chart(12), filename, True)
+        assert sorted(os.listdir(tmp_path)) == ['chart.json', 'chart.new.json', 'chart.new.svg', 'chart.svg']
+
+
+class TestCached:
+    """Test cached."""
+
+    @staticmethod
+    def test_cached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv('WAYS_PY_CACHE', str(tmp_path / "cache"))
+        source = tmp_path / "data.csv"
+        source.write_text("a,b\n1,2\n")
+        filename = cached(source.as_uri())
+        assert os.path.dirname(filename) == str(tmp_path / "cache")
+        source.write_text("a,b\n3,4\n")
+        assert cached(source.as_uri()) == filename
+        with open(filename) as f:
+            assert f.read() == "a,b\n1,2\n"
+        assert os.listdir(tmp_path / "cache") == [os.path.basename(filename)]
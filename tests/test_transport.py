@@ -0,0 +1,95 @@
+"""Test module for ways_py.transport."""
+
+import os
+from pathlib import Path
+
+import altair as alt  # type: ignore
+import pandas as pd  # type: ignore
+import pytest
+from tests.data import choropleth_data, synthetic_data
+
+from ways_py.transport import dataset_hash, load_dataset, save_dataset
+from ways_py.ways import AltairColorViz
+
+pytest.importorskip("pyarrow")
+
+
+def example_data() -> pd.DataFrame:
+    """Synthetic data with a column of each type that a chart might use."""
+    data = synthetic_data(1000)
+    data['name'] = data.z.astype(str)
+    data['date'] = pd.date_range('2020-01-01', periods=len(data), freq='h')
+    data['flag'] = data.z > 25
+    return data
+
+
+class TestDatasets:
+    """Test saving and loading datasets."""
+
+    @staticmethod
+    @pytest.mark.parametrize("format", ['arrow', 'parquet', 'csv'])
+    def test_round_trip(tmp_path: Path, format: str) -> None:
+        data = example_data()
+        filename = save_dataset(data, str(tmp_path), format)
+        assert os.path.basename(filename) == f'data-{dataset_hash(data)}.{format}'
+        loaded = load_dataset(filename)
+        if format == 'csv':
+            # CSV doesn't distinguish strings of digits from numbers, or record types
+            loaded['name'] = loaded.name.astype(str)
+            loaded['date'] = pd.to_datetime(loaded.date)
+        pd.testing.assert_frame_equal(loaded, data)
+
+    @staticmethod
+    def test_saved_once(tmp_path: Path) -> None:
+        filename = save_dataset(synthetic_data(1000), str(tmp_path))
+        modified = os.path.getmtime(filename)
+        # equal data (although a different DataFrame) saved to the same file, which isn't rewritten
+        assert save_dataset(synthetic_data(1000), str(tmp_path)) == filename
+        assert os.path.getmtime(filename) == modified
+        assert save_dataset(synthetic_data(1001), str(tmp_path)) != filename
+        assert len(os.listdir(tmp_path)) == 2
+
+    @staticmethod
+    def test_memory_mapped(tmp_path: Path) -> None:
+        data = load_dataset(save_dataset(synthetic_data(1000), str(tmp_path)))
+        # a view of the file, rather than a copy
+        assert not data.x.to_numpy().flags.writeable
+        assert data.x.sum() == synthetic_data(1000).x.sum()
+
+    @staticmethod
+    def test_unsupported(tmp_path: Path) -> None:
+        with pytest.raises(ValueError):
+            save_dataset(synthetic_data(10), str(tmp_path), 'xlsx')
+
+
+class TestFileTransformer:
+    """Test the ways_py_file data transformer."""
+
+    @staticmethod
+    def test_decorated(tmp_path: Path) -> None:
+        data = example_data()
+        chart = AltairColorViz.decorate(
+            alt.Chart(data).mark_circle().encode(x='x', y='y', color=alt.Color('z', bin=alt.Bin(maxbins=20)))
+        )
+        with alt.data_transformers.enable('ways_py_file', directory=str(tmp_path), url_prefix='data/'):
+            spec = chart.to_dict()
+        assert 'datasets' not in spec
+        # one file, which Altair moves to the top level as every sub-chart uses it
+        name = f'data-{dataset_hash(data)}'
+        assert spec['data'] == {
+            'url': f'data/{name}.csv',
+            'format': {
+                'type': 'csv',
+                'parse': {'x': 'number', 'y': 'number', 'z': 'number', 'date': 'date', 'flag': 'boolean'}
+            }
+        }
+        # and an Arrow copy for Python readers
+        assert sorted(os.listdir(tmp_path)) == [f'{name}.arrow', f'{name}.csv']
+
+    @staticmethod
+    def test_geo_embedded(tmp_path: Path) -> None:
+        chart = alt.Chart(choropleth_data()).mark_geoshape()
+        with alt.data_transformers.enable('ways_py_file', directory=str(tmp_path)):
+            spec = chart.to_dict()
+        assert list(spec['datasets'].values())[0][0]['type'] == 'Feature'
+        assert os.listdir(tmp_path) == []
@@ -1,17 +1,35 @@
 """Test module for backfillz."""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import gc
 import inspect
+import json
 import math
 import os
-from typing import Any, List, Optional
+import subprocess
+import sys
+import threading
+from typing import Any, cast, Dict, Iterator, List, Optional, Tuple
 
 from _pytest.config import Config
 import altair as alt  # type: ignore
-import geopandas as gpd  # type: ignore
+from ipywidgets.widgets import widget_output  # type: ignore
+import numpy as np
 import pandas as pd  # type: ignore
 import pytest
+from tests.data import (
+    choropleth_data, example_choropleth, example_scatterplot, scatterplot_data, synthetic_data
+)
 
-from ways_py.ways import altair_color_viz
+from ways_py import ways
+from ways_py.serialise import to_json
+from ways_py.testing import expect_fig
+from ways_py.ways import (
+    AltairColorViz, AltairColorWidgets, bin_params, ChartCache, column_stats, DataFile, Debounced,
+    Event, instrument, mimebundle, multi_bin_counts, multi_column_stats, StreamingData, vega_bin_params,
+    vega_bins
+)
 
 
 @pytest.fixture()
@@ -20,117 +38,20 @@ def headless(pytestconfig: Config) -> bool:
     return str(pytestconfig.getoption("headless")) == "True"
 
 
-def expect_fig(fig: alt.Chart, filename: str, headless: bool) -> None:
-    """Check for equivalence to stored output baselines.
-
-    The tests rely on altair_saver (https://pypi.org/project/altair-saver/), which in turn needs chromedriver
-    or similar to be installed.
-
-    For each approval test, there are two expected outputs (a.k.a. "baselines"):
-      - Vega-Lite spec (in JSON format)
-      - SVG image corresponding to Vega-Lite spec
-
-    1. A change to the _image_ (which implies that the Vega Lite also changed) is reported as a test failure.
-       To promote to a baseline, move the .new.svg and .new.json files over the corresponding .svg and .json.
-
-    2. Otherwise, the approval test passes. If the Vega Lite has changed, the change is interpreted as a
-       refactoring (since it has no visual consequences). This will generate a revised .json file without
-       the .new prefix, which can simply be committed as usual.
-
-    When a new approval test is run for the first time, the situation is similar to (1) except that there are
-    no preexisting .svg or .json files.
-
-    Some useful `git` aliases are defined in `.gitconfig.aliases` (include the file into your `.gitconfig` to
-    enable):
+@pytest.fixture()
+def displayed_specs(monkeypatch: pytest.MonkeyPatch) -> Iterator[List[Dict[str, Any]]]:
+    """Capture (rather than display) the Vega-Lite specs of charts displayed by ways_py.ways."""
+    specs: List[Dict[str, Any]] = []
 
-    - `git approve` renames all .new files so that they overwrite the existing baselines (use with care)
-    - `git reject` discards all .new files
-    """
-    if not headless:
-        fig.show()
-
-    # easy API call to convert to Vega-Lite; create file later if needed
-    ext_vl: str = 'json'
-    filename_vl: str = filename + '.' + ext_vl
-    have_vl = fig.to_json()
-
-    # go via a file to convert to .svg; keep file around in case needed
-    ext_image: str = 'svg'
-    filename_new_image: str = filename + '.new.' + ext_image
-    fig.save(filename_new_image)
-    file_image = open(filename_new_image, 'rb')
-    have_image = file_image.read()
-
-    try:
-        # load baselines for both Vega-Lite and .svg
-        file_vl = open(filename_vl, 'r')
-        expected_vl = file_vl.read()
-        file_image = open(filename + '.' + ext_image, 'rb')
-        expected_image = file_image.read()
-
-        if expected_vl != have_vl:
-            print(f"{filename}: Vega-Lite changed.")
-            filename_new_vl = filename + '.new.' + ext_vl if expected_image != have_image else filename_vl
-            file_new_vl = open(filename_new_vl, 'w')
-            file_new_vl.write(have_vl)
-        else:
-            print(f"{filename}: Vega-Lite identical.")
-
-        # require (Vega Lite -> image) to be a function
-        assert expected_image == have_image, f"{filename}: image changed."
-        print(f"{filename}: image identical.")
-        os.remove(filename_new_image)
-
-    except FileNotFoundError as e:
-        file_new = open(e.filename, 'w')
-        file_new.write(have_vl)
-        print(f"{filename}: initial Vega-Lite baseline.")
-        assert False, f"{filename}: image not found."
-
-
-def choropleth_data() -> Any:
-    """Dataset for choropleth example."""
-    geo_states = gpd.read_file('notebooks/gz_2010_us_040_00_500k.json')
-    df_polls = pd.read_csv('notebooks/presidential_poll_averages_2020.csv')
-    trump_data = df_polls[df_polls.candidate_name == 'Donald Trump']
-    trump_data.columns = [
-        'cycle', 'NAME', 'modeldate', 'candidate_name', 'pct_estimate', 'pct_trend_adjusted'
-    ]
-    geo_states_trump = geo_states.merge(trump_data, on='NAME')
-    return geo_states_trump[geo_states_trump.modeldate == '11/03/2020']
-
-
-@altair_color_viz
-def example_choropleth(candidate_states: pd.DataFrame, title: str, extent: Optional[List[int]]) -> alt.Chart:
-    """Choropleth of the US states with the candidate vote percentage mapped to color."""
-    color = alt.Color(shorthand='pct_estimate', bin=alt.Bin(maxbins=20), scale=alt.Scale(type='band'))
-    chart = alt.Chart(candidate_states, title=title) \
-        .mark_geoshape() \
-        .encode(color, tooltip=['NAME', 'pct_estimate']) \
-        .properties(width=500, height=300) \
-        .project(type='albersUsa')
-
-    if extent is not None:
-        chart.encoding.color.bin.extent = extent
-
-    return chart
-
-
-def scatterplot_data() -> Any:
-    """Data on movies from IMDB and Rotten Tomatoes."""
-    from vega_datasets import data  # type: ignore
-    import ssl
-    ssl._create_default_https_context = ssl._create_unverified_context
-    return pd.read_json(data.movies.url)
-
-
-@altair_color_viz
-def example_scatterplot(data: pd.DataFrame, color: alt.Color, title: str) -> alt.Chart:
-    """Scatterplot of IMdB ratings vs. Rotten Tomatoes by budget."""
-    chart = alt.Chart(data, title=title) \
-        .mark_circle() \
-        .encode(x='IMDB_Rating', y='Rotten_Tomatoes_Rating', color=color)
-    return chart
+    def display(*objs: Any, raw: bool = False, metadata: Any = None) -> None:
+        for obj in objs:
+            if raw:
+                specs.extend(spec for mimetype, spec in obj.items() if mimetype == 'application/json')
+            elif isinstance(obj, alt.TopLevelMixin):
+                specs.append(obj.to_dict())
+    monkeypatch.setattr(ways, 'display', display)
+    with alt.renderers.enable('json'):
+        yield specs
 
 
 class TestAltairColorViz:
@@ -154,7 +75,7 @@ class TestAltairColorViz:
             example_scatterplot(scatterplot_data(), 'Production_Budget', inspect.stack()[0][3])
         assert e.value.args[0] == "Can only apply decorator to chart with color.bin defined."
 
-    # In this case "colors used" is an empty plot. See https://github.com/WarwickCIM/ways-py/issues/63.
+    # Not binned: "colours used" shows the continuous colour scale at each value of the data.
     @staticmethod
     def test_scatterplot_bin_False(headless: bool) -> None:
         color = alt.Color(shorthand='Production_Budget', bin=False)
@@ -167,3 +88,743 @@ class TestAltairColorViz:
         color = alt.Color(shorthand='Production_Budget', bin=alt.Bin(maxbins=20), scale=scale)
         chart: alt.Chart = example_scatterplot(scatterplot_data(), color, inspect.stack()[0][3])
         expect_fig(chart, "tests/expected/AltairColorViz/scatterplot", headless)
+
+
+def spec_size(chart: alt.Chart) -> int:
+    """Size in bytes of the compact Vega-Lite spec for a chart."""
+    return len(json.dumps(chart.to_dict()))
+
+
+class TestSharedData:
+    """Test the shared_data mode of AltairColorViz.decorate."""
+
+    @staticmethod
+    def example_chart(rows: int, bin: Any) -> alt.Chart:
+        return alt.Chart(synthetic_data(rows)) \
+            .mark_circle() \
+            .encode(x='x', y='y', color=alt.Color('z', bin=bin))
+
+    @staticmethod
+    @pytest.mark.parametrize("bin", [False, alt.Bin(maxbins=20)])
+    def test_single_dataset(bin: Any) -> None:
+        spec = AltairColorViz.decorate(TestSharedData.example_chart(1000, bin), shared_data=True).to_dict()
+        assert len(spec['datasets']) == 1
+        assert all('data' not in chart for chart in spec['hconcat'])
+
+    @staticmethod
+    @pytest.mark.parametrize("bin", [False, alt.Bin(maxbins=20)])
+    def test_spec_size_linear(bin: Any) -> None:
+        sizes = []
+        for rows in [1000, 2000, 4000]:
+            src_size = spec_size(TestSharedData.example_chart(rows, bin))
+            chart = AltairColorViz.decorate(TestSharedData.example_chart(rows, bin), shared_data=True)
+            size = spec_size(chart)
+            # data is embedded once, so decorating only adds a (constant) amount of spec
+            assert size < src_size * 1.1
+            sizes.append(size)
+        assert sizes[1] / sizes[0] < 2.2
+        assert sizes[2] / sizes[1] < 2.2
+
+
+class TestColumnStats:
+    """Test column_stats."""
+
+    @staticmethod
+    def test_nulls() -> None:
+        data = pd.DataFrame({'z': [3.5, None, -1, 7, None]})
+        assert column_stats(data, 'z') == (-1, 7, 3, 2)
+        assert column_stats(pd.DataFrame({'z': [None, None]}, dtype=float), 'z')[2:] == (0, 2)
+
+    @staticmethod
+    def test_cached() -> None:
+        data = synthetic_data(1000)
+        stats = column_stats(data, 'z')
+        assert column_stats(data, 'z') is stats
+        assert column_stats(data.copy(), 'z') is not stats
+
+    @staticmethod
+    def test_density_chart_nulls() -> None:
+        data = pd.DataFrame({'z': [None, 10, 20, 30]})
+        chart = AltairColorViz.density_chart(alt.Chart(data).encode(color=alt.Color('z', bin=alt.Bin())))
+        assert chart.encoding.y.axis.values == [0, 10, 30, 50]
+
+
+class TestPrecompute:
+    """Test the precompute mode of AltairColorViz."""
+
+    @staticmethod
+    def test_bin_params() -> None:
+        assert bin_params((0, 1), 10) == (0, 1, 0.1)
+        assert bin_params((0, 100), 100) == (0, 100, 1)
+        assert bin_params((218, 300000000), 20) == (0, 300000000, 20000000)
+
+    @staticmethod
+    def test_bin_counts() -> None:
+        ys = pd.Series([0, 0.5, 1, 1.5, 2, None])
+        counts = AltairColorViz.bin_counts(ys, alt.Bin(maxbins=4))
+        assert list(counts.bin_start) == [0, 0.5, 1, 1.5]
+        assert list(counts.bin_end) == [0.5, 1, 1.5, 2]
+        # the maximum value falls in the last bin; nulls are not counted
+        assert list(counts['count']) == [1, 1, 1, 2]
+
+    @staticmethod
+    def test_density_chart_size() -> None:
+        src = TestSharedData.example_chart(4000, alt.Bin(maxbins=20))
+        chart = AltairColorViz.density_chart(src, precompute=True)
+        assert len(chart.data) <= 100
+        assert chart.data.proportion.sum() == pytest.approx(1)
+
+    @staticmethod
+    def test_density_chart_nulls() -> None:
+        data = pd.DataFrame({'x': [1, 2], 'y': [3, 4], 'z': [None, None]}, dtype=float)
+        src = alt.Chart(data).mark_circle().encode(x='x', y='y', color=alt.Color('z', bin=alt.Bin()))
+        chart = AltairColorViz.density_chart(src, precompute=True)
+        assert len(chart.data) == 0
+        # as over the row budget, which precomputes
+        spec = AltairColorViz.decorate(src, max_rows=1).to_dict()
+        assert spec['datasets'][spec['hconcat'][0]['data']['name']] == []
+
+    @staticmethod
+    def test_used_colours_size() -> None:
+        src = TestSharedData.example_chart(4000, alt.Bin(maxbins=20))
+        chart = AltairColorViz.used_colours(src, precompute=True)
+        assert len(chart.data) <= 20
+        # colour bins fixed to the extent of the original data
+        assert chart.encoding.color.bin.extent == [0, 49]
+
+
+class TestUsedColours:
+    """Test the non-binned variant of AltairColorViz.used_colours."""
+
+    @staticmethod
+    def test_distinct_values() -> None:
+        src = TestSharedData.example_chart(4000, False)
+        chart = AltairColorViz.used_colours(src)
+        # just the colour column, once per value, in order of first appearance
+        assert list(chart.data.columns) == ['z']
+        assert list(chart.data.z) == list(src.data.z.drop_duplicates())
+
+    @staticmethod
+    def test_max_values() -> None:
+        data = pd.DataFrame({'x': 0, 'y': 0, 'z': np.random.default_rng(0).normal(size=100_000)})
+        src = alt.Chart(data).mark_circle().encode(x='x', y='y', color=alt.Color('z', bin=False))
+        chart = AltairColorViz.used_colours(src, max_values=500)
+        assert 400 < len(chart.data) <= 500
+        assert (chart.data.z.min(), chart.data.z.max()) == (data.z.min(), data.z.max())
+        # evenly spaced quantiles of the data
+        assert chart.data.z.median() == pytest.approx(data.z.median(), abs=0.01)
+
+    @staticmethod
+    def test_quantile_values() -> None:
+        counts = pd.Series([1, 97, 1, 1, None]).value_counts(dropna=False)
+        assert list(AltairColorViz.quantile_values(counts, 3)) == [1, 97]
+        assert list(AltairColorViz.quantile_values(counts, 10)) == [1, 97]
+        counts = pd.Series(range(100)).value_counts()
+        assert list(AltairColorViz.quantile_values(counts, 5)) == [0, 25, 50, 75, 99]
+
+
+class TestStreamingData:
+    """Test StreamingData, with the running aggregates compared with those of all the rows."""
+
+    @staticmethod
+    def batches() -> List[pd.DataFrame]:
+        """Batches of rows, the last of which extends the extent of the earlier ones."""
+        data = synthetic_data(1000)
+        data.loc[::7, 'z'] = None
+        batches = [data[:500], data[500:900], data[900:].assign(z=data[900:].z * 2)]
+        return [batch.reset_index(drop=True) for batch in batches]
+
+    @staticmethod
+    @pytest.mark.parametrize("bin", [alt.Bin(maxbins=20), alt.Bin(maxbins=20, extent=[10, 40]), False])
+    def test_aggregates(bin: Any) -> None:
+        batches = TestStreamingData.batches()
+        stream = StreamingData(batches[0], 'z')
+        for batch in batches[1:]:
+            stream.append(batch)
+        data = pd.concat(batches, ignore_index=True)
+        pd.testing.assert_frame_equal(stream.data, data)
+        assert column_stats(stream.data, 'z') == column_stats(data, 'z')
+        pd.testing.assert_series_equal(stream.value_counts('z'),
+                                       data.z.value_counts(sort=False, dropna=False))
+
+        def chart(data: pd.DataFrame) -> alt.Chart:
+            return alt.Chart(data).mark_circle().encode(x='x', y='y', color=alt.Color('z', bin=bin))
+        assert AltairColorViz.decorate(chart(stream.data), precompute=True).to_dict() == \
+            AltairColorViz.decorate(chart(data), precompute=True).to_dict()
+
+    @staticmethod
+    def test_original_data() -> None:
+        batches = TestStreamingData.batches()
+        stream = StreamingData(batches[0], 'z')
+        frames = [batches[0]]
+        for batch in batches[1:]:
+            stream.append(batch)
+            frames.append(stream.data)
+
+        def chart(data: pd.DataFrame) -> alt.Chart:
+            return alt.Chart(data).mark_circle().encode(x='x', y='y', color=alt.Color('z', bin=alt.Bin()))
+        # the frames superseded by appends are aggregated alone, not with the rows appended since
+        for data in frames[:-1]:
+            assert AltairColorViz.density_chart(chart(data), precompute=True).data.proportion.sum() == \
+                pytest.approx(1 - data.z.isna().mean())
+            assert AltairColorViz._value_counts(data, 'z').sum() == len(data)
+        assert AltairColorViz.decorate(chart(batches[0]), precompute=True).to_dict() == \
+            AltairColorViz.decorate(chart(batches[0].copy()), precompute=True).to_dict()
+
+    @staticmethod
+    def test_incremental(monkeypatch: pytest.MonkeyPatch) -> None:
+        batches = TestStreamingData.batches()
+        stream = StreamingData(batches[0], 'z')
+        bin = alt.Bin(maxbins=20)
+        expected = AltairColorViz.bin_counts(pd.concat(batches[:2]).z, bin)
+        stream.bin_counts('z', bin)
+        binned = []
+        bin_counts = AltairColorViz.bin_counts
+
+        def spy(ys: pd.Series, bin: Any, params: Any = None) -> pd.DataFrame:
+            binned.append(len(ys))
+            return bin_counts(ys, bin, params)
+        monkeypatch.setattr(AltairColorViz, 'bin_counts', spy)
+        # within the extent so far: only the new rows are binned
+        stream.append(batches[1])
+        pd.testing.assert_frame_equal(stream.bin_counts('z', bin), expected)
+        assert binned == [len(batches[1])]
+        # beyond it: the bins change, so all the rows are binned
+        stream.append(batches[2])
+        stream.bin_counts('z', bin)
+        assert binned[-1] == sum(len(batch) for batch in batches)
+
+    @staticmethod
+    def test_multi_column_stats() -> None:
+        data = synthetic_data(100).assign(
+            n=lambda df: df.z.where(df.z > 10), none=np.nan, name=lambda df: df.z.astype(str), flag=True
+        )
+        stats = multi_column_stats(data, list(data.columns))
+        assert stats == {column: column_stats(data.copy(), column) for column in data.columns}
+        assert type(stats['z'].min) is int
+
+    @staticmethod
+    def test_multi_bin_counts() -> None:
+        data = synthetic_data(1000).assign(n=lambda df: df.z.where(df.z > 10) / 7)
+        bins = [('z', alt.Bin(maxbins=20)), ('n', alt.Bin(maxbins=100)),
+                ('z', alt.Bin(maxbins=7, extent=[5, 20]))]
+        params = [vega_bin_params(data[column], bin) for column, bin in bins]
+        counts = multi_bin_counts(data, [(column, p) for (column, _), p in zip(bins, params)])
+        for (column, bin), p, count in zip(bins, params, counts):
+            pd.testing.assert_frame_equal(count, AltairColorViz.bin_counts(data[column], bin))
+
+
+class TestRowBudget:
+    """Test the max_rows and sample options of AltairColorViz.decorate."""
+
+    @staticmethod
+    @pytest.mark.parametrize("bin", [False, alt.Bin(maxbins=20)])
+    def test_scatterplot(bin: Any) -> None:
+        with pytest.raises(alt.MaxRowsError):
+            AltairColorViz.decorate(TestSharedData.example_chart(20000, bin), max_rows=5000, sample=False) \
+                .to_dict()
+        spec = AltairColorViz.decorate(TestSharedData.example_chart(20000, bin), max_rows=5000).to_dict()
+        density, used, main = [spec['datasets'][chart['data']['name']] for chart in spec['hconcat']]
+        assert len(main) == 5000
+        # meta-visualisations aggregate all of the data
+        assert len(density) <= 100
+        assert sum(row['proportion'] for row in density) == pytest.approx(1)
+        assert len(used) <= 50
+        # colours as for the full data
+        color = spec['hconcat'][2]['encoding']['color']
+        assert (color['bin']['extent'] if bin else color['scale']['domain']) == [0, 49]
+
+    @staticmethod
+    def test_sample_order() -> None:
+        src = TestSharedData.example_chart(1000, False)
+        # an index that isn't in order
+        src.data.index = np.random.default_rng(1).permutation(1000).astype(str)
+        sample = AltairColorViz.sample(src, 100).data
+        positions = [src.data.index.get_loc(label) for label in sample.index]
+        assert len(sample) == 100 and positions == sorted(positions)
+
+    @staticmethod
+    def test_choropleth() -> None:
+        data = choropleth_data()
+        chart = example_choropleth(data, 'test_choropleth', None)
+        budget_chart = AltairColorViz.decorate(example_choropleth.__wrapped__(data, 'test_choropleth', None),
+                                               max_rows=10)
+        assert budget_chart.hconcat[0].data.proportion.sum() == pytest.approx(1)
+        assert budget_chart.hconcat[0].encoding.y.axis.values == chart.hconcat[0].encoding.y.axis.values
+        assert len(budget_chart.hconcat[2].data) == 10
+
+
+class TestFacets:
+    """Test AltairColorViz.decorate_facets."""
+
+    @staticmethod
+    def example_chart(bin: Any) -> alt.Chart:
+        data = synthetic_data(4000)
+        data['g'] = (data.x * 4).astype(int)
+        data.loc[:9, 'g'] = None
+        return alt.Chart(data).mark_circle().encode(x='x', y='y', color=alt.Color('z', bin=bin))
+
+    @staticmethod
+    def test_aggregates() -> None:
+        src = TestFacets.example_chart(alt.Bin(maxbins=20))
+        chart = AltairColorViz.decorate_facets(src, 'g')
+        assert len(chart.vconcat) == 4
+        hist, colours = chart.vconcat[0].hconcat[0].data, chart.vconcat[0].hconcat[1].data
+        for g in range(4):
+            # as for decorating each group separately, with colour bins fixed to the extent of all groups
+            group = TestFacets.example_chart(alt.Bin(maxbins=20, extent=[0, 49]))
+            group.data = src.data[src.data.g == g]
+            expected = AltairColorViz.density_chart(group, precompute=True).data
+            pd.testing.assert_frame_equal(hist[hist.g == g].drop(columns='g').reset_index(drop=True),
+                                          expected)
+            expected = AltairColorViz.used_colours(group, precompute=True).data
+            pd.testing.assert_frame_equal(colours[colours.g == g].drop(columns='g').reset_index(drop=True),
+                                          expected)
+
+    @staticmethod
+    def test_values() -> None:
+        src = TestFacets.example_chart(False)
+        chart = AltairColorViz.decorate_facets(src, 'g', max_values=20)
+        values = chart.vconcat[0].hconcat[1].data
+        for g in range(4):
+            group = src.data[src.data.g == g]
+            assert sorted(values[values.g == g].z) == \
+                list(AltairColorViz.quantile_values(group.z.value_counts(), 20).sort_values())
+        assert chart.vconcat[0].hconcat[2].encoding.color.scale.domain == [0, 49]
+
+    @staticmethod
+    @pytest.mark.parametrize("bin", [False, alt.Bin(maxbins=20)])
+    def test_embedded_once(bin: Any) -> None:
+        spec = AltairColorViz.decorate(TestFacets.example_chart(bin), facet='g').to_dict()
+        # the data, histograms and colours used
+        assert len(spec['datasets']) == 3
+        assert [row['title'] for row in spec['vconcat']] == [f'g = {g}.0' for g in range(4)]
+        for g, row in enumerate(spec['vconcat']):
+            for chart in row['hconcat']:
+                assert chart['transform'][-1] == {'filter': {'field': 'g', 'equal': g}}
+
+    @staticmethod
+    def test_colour_field() -> None:
+        with pytest.raises(ValueError):
+            AltairColorViz.decorate_facets(TestFacets.example_chart(False), 'z')
+
+
+def vega_bin_cases() -> List[Dict[str, Any]]:
+    """Bin parameters and values to bin, for checking `vega_bins` against Vega-Lite."""
+    rng = np.random.default_rng(0)
+    extents = [(0, 1), (0, 100), (218, 300000000), (-5.5, 17.25), (0.000001, 0.000003), (0.1, 0.3),
+               (-1000, -10), (5, 5), (0, 0), (12345.678, 12399.1), (-0.004, 0.007), (1.4, 9.2), (30.12, 62.8)]
+    cases: List[Dict[str, Any]] = []
+    for lo, hi in extents:
+        values = [lo, hi, (lo + hi) / 2] + list(rng.uniform(lo, hi, 8)) + [None]
+        for maxbins in [2, 3, 5, 6, 7, 10, 13, 20, 50, 100]:
+            cases.append({'bin': {'maxbins': maxbins}, 'values': values})
+        span = hi - lo or 1
+        for bin in [
+            {'maxbins': 10, 'nice': False},
+            {'step': span / 7},
+            {'steps': [span / 50, span / 20, span / 8]},
+            {'maxbins': 10, 'base': 2},
+            {'maxbins': 10, 'divide': [4, 2]},
+            {'maxbins': 100, 'minstep': span / 5},
+            {'maxbins': 10, 'anchor': lo + span * 0.37}
+        ]:
+            cases.append({'bin': bin, 'values': values})
+        if lo < hi:
+            cases.append({'bin': {'maxbins': 8, 'extent': [lo + span / 4, hi - span / 4]}, 'values': values})
+    return cases
+
+
+def vega_lite_bins(case: Dict[str, Any]) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """Bin starts and ends computed by Vega-Lite (via vl-convert), with None for null or infinite values."""
+    import vl_convert  # type: ignore
+    spec: Dict[str, Any] = {
+        'data': {'values': [{'i': i, 'v': v} for i, v in enumerate(case['values'])]},
+        'transform': [
+            {'bin': case['bin'], 'field': 'v', 'as': ['y', 'y2']},
+            {'calculate': "datum.i + ' ' + datum.y + ' ' + datum.y2", 'as': 'text'}
+        ],
+        'mark': 'text',
+        'encoding': {'text': {'field': 'text'}}
+    }
+    scenegraph = vl_convert.vegalite_to_scenegraph(spec)
+
+    def texts(node: Any) -> List[str]:
+        if isinstance(node, dict):
+            return ([node['text']] if isinstance(node.get('text'), str) else []) + texts(list(node.values()))
+        if isinstance(node, list):
+            return [text for child in node for text in texts(child)]
+        return []
+
+    def number(s: str) -> Optional[float]:
+        return float(s) if s != 'null' and math.isfinite(float(s)) else None
+
+    rows = sorted([text.split(' ') for text in texts(scenegraph)], key=lambda row: int(row[0]))
+    return [number(row[1]) for row in rows], [number(row[2]) for row in rows]
+
+
+class TestVegaBins:
+    """Conformance of `vega_bins` with the bin transform of Vega-Lite.
+
+    The expected bins in `tests/expected/vega_bins.json` were computed by Vega-Lite; if vl-convert is
+    installed, `test_expected` checks them against Vega-Lite directly.
+    """
+
+    filename = "tests/expected/vega_bins.json"
+
+    @staticmethod
+    def test_vega_bins() -> None:
+        with open(TestVegaBins.filename) as file:
+            expected = json.load(file)
+        cases = vega_bin_cases()
+        assert len(cases) == len(expected)
+        for case, (expected_starts, expected_ends) in zip(cases, expected):
+            starts, ends = vega_bins(pd.Series(case['values'], dtype=float), alt.Bin(**case['bin']))
+            have_starts = [None if np.isnan(start) else start for start in starts]
+            have_ends = [None if np.isnan(end) else end for end in ends]
+            assert (have_starts, have_ends) == (expected_starts, expected_ends), case
+
+    @staticmethod
+    def test_expected() -> None:
+        pytest.importorskip("vl_convert")
+        with open(TestVegaBins.filename) as file:
+            expected = json.load(file)
+        assert [list(vega_lite_bins(case)) for case in vega_bin_cases()] == expected
+
+
+class TestAltairColorWidgets:
+    """Test AltairColorWidgets, with charts captured rather than displayed."""
+
+    @staticmethod
+    def example_chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+        return AltairColorViz.decorate(alt.Chart(data).mark_circle().encode(x='x', y='y', color=color))
+
+    @staticmethod
+    def test_incremental(displayed_specs: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch,
+                         tmp_path: Any) -> None:
+        monkeypatch.chdir(tmp_path)
+        color_widgets = AltairColorWidgets()
+        chart = TestAltairColorWidgets.example_chart
+        color_widgets.display(synthetic_data(1000), 'z', chart, incremental=True)
+        color_widgets.colorscheme.value = 'reds'
+        color_widgets.maxbins.value = 5
+        # data written once, and referred to by URL
+        assert len(os.listdir(tmp_path)) == 1
+        assert displayed_specs[-1]['data']['url'] == os.listdir(tmp_path)[0]
+        assert 'datasets' not in displayed_specs[-1]
+        assert displayed_specs[-1]['hconcat'][2]['encoding']['color']['scale']['scheme'] == 'reds'
+        assert alt.data_transformers.active == 'default'
+
+    @staticmethod
+    def test_data_file(displayed_specs: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch,
+                       tmp_path: Any) -> None:
+        monkeypatch.chdir(tmp_path)
+        os.mkdir('data')
+        color_widgets = AltairColorWidgets()
+        chart = TestAltairColorWidgets.example_chart
+        color_widgets.display(synthetic_data(100), 'z', chart, incremental=True,
+                              directory='data', url_prefix='files/data/')
+        # written to the directory, and referred to by the URL prefix
+        [filename] = os.listdir('data')
+        assert displayed_specs[-1]['data']['url'] == 'files/data/' + filename
+        assert os.listdir(tmp_path) == ['data']
+        color_widgets.append(synthetic_data(10))
+        assert displayed_specs[-1]['data']['url'] == f'files/data/{filename}?rows=110'
+        # the file of a widget displayed again, or closed, is removed
+        color_widgets.display(synthetic_data(100), 'z', chart, incremental=True, directory='data')
+        [filename] = os.listdir('data')
+        color_widgets.close()
+        assert os.listdir('data') == []
+        # as is that of a widget which is garbage collected (or still open at exit)
+        data_file = DataFile(synthetic_data(100), 'data')
+        assert os.listdir('data') == [os.path.basename(data_file.filename)]
+        del data_file
+        gc.collect()
+        assert os.listdir('data') == []
+
+    @staticmethod
+    def test_append(displayed_specs: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch,
+                    tmp_path: Any) -> None:
+        monkeypatch.chdir(tmp_path)
+        color_widgets = AltairColorWidgets()
+        with pytest.raises(RuntimeError):
+            color_widgets.append(synthetic_data(10))
+        batches = TestStreamingData.batches()
+        color_widgets.display(batches[0], 'z', TestAltairColorWidgets.example_chart, incremental=True)
+        [filename] = os.listdir(tmp_path)
+        for n, batch in enumerate(batches[1:], 2):
+            color_widgets.append(batch)
+            # the new rows added to the file, which the new chart refers to
+            assert len(displayed_specs) == n
+            url, query = displayed_specs[-1]['data']['url'].split('?')
+            assert url == filename
+            assert query == f'rows={sum(map(len, batches[:n]))}'
+        assert os.listdir(tmp_path) == [filename]
+        with open(filename) as f:
+            records = json.load(f)
+        assert records == json.loads(pd.concat(batches).to_json(orient='records', double_precision=15))
+        # the extent widgets, set from the data, follow it
+        assert (color_widgets.extentmin.value, color_widgets.extentmax.value) == (0, 98)
+
+    @staticmethod
+    def test_concurrent_serialise(displayed_specs: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch,
+                                  tmp_path: Any) -> None:
+        monkeypatch.chdir(tmp_path)
+        widgets = []
+        for rows in [100, 200]:
+            color_widgets = AltairColorWidgets()
+            color_widgets.display(synthetic_data(rows), 'z', TestAltairColorWidgets.example_chart,
+                                  incremental=True)
+            widgets.append(color_widgets)
+        charts = []
+        for w in widgets:
+            data, color, _ = w._chart_key()
+            charts.append((w, data, TestAltairColorWidgets.example_chart(data, color)))
+        active = alt.data_transformers.active
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [(w, executor.submit(w._serialise, chart, data)) for w, data, chart in charts * 20]
+            # each chart refers to its own widget's data, however the serialisations interleave
+            for w, future in futures:
+                spec = future.result()[0]['application/json']
+                assert spec['data'] == cast(DataFile, w._data_file).url_data
+        assert alt.data_transformers.active == active
+
+    @staticmethod
+    def test_columns(displayed_specs: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch) -> None:
+        data = synthetic_data(1000).assign(w=lambda df: df.z * 10 - 100)
+
+        def chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+            src = alt.Chart(data).mark_circle().encode(x='x', y='y', color=color)
+            return AltairColorViz.decorate(src, precompute=True)
+        color_widgets = AltairColorWidgets()
+        binned = []
+        bin_counts = AltairColorViz.bin_counts
+
+        def spy(*args: Any) -> pd.DataFrame:
+            binned.append(args)
+            return bin_counts(*args)
+        monkeypatch.setattr(AltairColorViz, 'bin_counts', spy)
+        color_widgets.display(data, ['z', 'w'], chart)
+        color_widgets.column.value = 'w'
+        color_widgets.bin.value = 'Continuous'
+        # one chart for each change, with bins already counted for each column
+        assert len(displayed_specs) == 3
+        assert binned == []
+        fields = [spec['hconcat'][2]['encoding']['color']['field'] for spec in displayed_specs]
+        assert fields == ['z', 'w', 'w']
+        # the extent widgets follow the column
+        assert (color_widgets.extentmin.value, color_widgets.extentmax.value) == (-100, 390)
+
+    @staticmethod
+    def test_asynchronous(displayed_specs: List[Dict[str, Any]]) -> None:
+        release = threading.Event()
+        schemes = []
+
+        def slow_chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+            schemes.append(color.scale.scheme)
+            release.wait(5)
+            return TestAltairColorWidgets.example_chart(data, color)
+
+        async def main() -> None:
+            color_widgets = AltairColorWidgets()
+            color_widgets.display(synthetic_data(1000), 'z', slow_chart, debounce=0, asynchronous=True)
+            # the kernel isn't blocked while the chart is built: only a placeholder has been displayed
+            await asyncio.sleep(0.05)
+            assert schemes == ['blues'] and displayed_specs == []
+            color_widgets.colorscheme.value = 'reds'
+            release.set()
+            while color_widgets._task is not None:
+                await asyncio.sleep(0.01)
+            # the chart for the superseded widget values is discarded
+            assert schemes == ['blues', 'reds']
+            assert len(displayed_specs) == 1
+            assert displayed_specs[0]['hconcat'][2]['encoding']['color']['scale']['scheme'] == 'reds'
+        asyncio.run(main())
+
+    @staticmethod
+    def test_coroutine_function(displayed_specs: List[Dict[str, Any]]) -> None:
+        async def chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+            await asyncio.sleep(0)
+            return TestAltairColorWidgets.example_chart(data, color)
+
+        async def main() -> None:
+            color_widgets = AltairColorWidgets()
+            color_widgets.display(synthetic_data(1000), 'z', chart, debounce=0)
+            assert displayed_specs == []
+            while color_widgets._task is not None:
+                await asyncio.sleep(0.01)
+        asyncio.run(main())
+        assert len(displayed_specs) == 1
+        # without an event loop, rendered at once
+        AltairColorWidgets().display(synthetic_data(1000), 'z', chart, debounce=0)
+        assert len(displayed_specs) == 2
+
+    @staticmethod
+    def test_errors_shown(displayed_specs: List[Dict[str, Any]], monkeypatch: pytest.MonkeyPatch) -> None:
+        shown = []
+
+        class Shell:
+            @staticmethod
+            def showtraceback(exc_info: Any, tb_offset: int) -> None:
+                shown.append(exc_info[1])
+        monkeypatch.setattr(widget_output, 'get_ipython', Shell)
+
+        def chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+            if color.scale.scheme == 'reds':
+                raise ValueError(color.scale.scheme)
+            return TestAltairColorWidgets.example_chart(data, color)
+
+        async def main() -> None:
+            color_widgets = AltairColorWidgets()
+            color_widgets.display(synthetic_data(1000), 'z', chart, debounce=0.01)
+            await asyncio.sleep(0.05)
+            # a debounced render, made by the event loop
+            color_widgets.colorscheme.value = 'reds'
+            await asyncio.sleep(0.05)
+        asyncio.run(main())
+        assert len(displayed_specs) == 1
+        assert [str(error) for error in shown] == ['reds']
+
+    @staticmethod
+    def test_render_count(displayed_specs: List[Dict[str, Any]]) -> None:
+        color_widgets = AltairColorWidgets()
+        color_widgets.display(synthetic_data(1000), 'z', TestAltairColorWidgets.example_chart)
+        # one plot initially, although setting the extent widgets from the data also changes them
+        assert color_widgets.render.calls == len(displayed_specs) == 1
+        color_widgets.colorscheme.value = 'reds'
+        assert color_widgets.render.calls == len(displayed_specs) == 2
+        with color_widgets.render.hold():
+            color_widgets.maxbins.value = 5
+            color_widgets.extentmax.value = 40
+        assert color_widgets.render.calls == len(displayed_specs) == 3
+
+
+class TestDebounced:
+    """Test Debounced."""
+
+    @staticmethod
+    def test_burst() -> None:
+        async def burst(debounced: Debounced) -> None:
+            for _ in range(10):
+                debounced()
+                await asyncio.sleep(0.001)
+            assert debounced.calls == 0
+            await asyncio.sleep(0.1)
+
+        debounced = Debounced(lambda: None, wait=0.05)
+        asyncio.run(burst(debounced))
+        assert debounced.calls == 1
+
+    @staticmethod
+    def test_flush() -> None:
+        async def requests(debounced: Debounced) -> None:
+            debounced()
+            debounced.flush()
+            debounced()
+            await asyncio.sleep(0.1)
+
+        debounced = Debounced(lambda: None, wait=0.05)
+        asyncio.run(requests(debounced))
+        assert debounced.calls == 2
+
+
+class TestChartCache:
+    """Test the cache of rendered charts used by AltairColorWidgets."""
+
+    @staticmethod
+    def test_lru() -> None:
+        cache = ChartCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert cache.get('b') is None
+        assert (len(cache), cache.hits, cache.misses) == (2, 1, 1)
+
+    @staticmethod
+    def test_widgets(displayed_specs: List[Dict[str, Any]]) -> None:
+        calls = []
+
+        def chart(data: pd.DataFrame, color: alt.Color) -> alt.Chart:
+            calls.append(color)
+            return TestAltairColorWidgets.example_chart(data, color)
+        color_widgets = AltairColorWidgets()
+        color_widgets.display(synthetic_data(1000), 'z', chart)
+        color_widgets.bin.value = 'Continuous'
+        color_widgets.bin.value = 'Binned'
+        color_widgets.bin.value = 'Continuous'
+        assert len(calls) == 2
+        assert len(displayed_specs) == 4
+        assert displayed_specs[0] == displayed_specs[2] and displayed_specs[1] == displayed_specs[3]
+        assert (color_widgets.cache.hits, color_widgets.cache.misses) == (2, 2)
+
+
+class TestInstrument:
+    """Test the instrument context manager."""
+
+    @staticmethod
+    def test_decorate() -> None:
+        callbacks: List[Event] = []
+        with instrument(callbacks.append) as events:
+            AltairColorViz.decorate(TestSharedData.example_chart(1000, alt.Bin(maxbins=20)), max_rows=100,
+                                    sample=True)
+        assert [event.stage for event in events] == ['density_chart', 'used_colours', 'sample', 'concat']
+        assert [event.rows for event in events] == [1000, 1000, 1000, 100]
+        assert all(event.seconds > 0 for event in events)
+        assert callbacks == events
+        # nothing recorded outside the context
+        AltairColorViz.decorate(TestSharedData.example_chart(1000, alt.Bin(maxbins=20)))
+        assert len(events) == 4
+
+    @staticmethod
+    def test_serialise() -> None:
+        chart = AltairColorViz.decorate(TestSharedData.example_chart(1000, alt.Bin(maxbins=20)))
+        with instrument() as events:
+            spec = to_json(chart)
+            bundle, _ = mimebundle(chart)
+        assert [event.stage for event in events] == ['serialise', 'serialise']
+        assert [event.rows for event in events] == [1000, 1000]
+        assert events[0].bytes == len(spec.encode())
+        assert events[1].bytes is not None and events[1].bytes > 1000
+
+    @staticmethod
+    def test_widgets(displayed_specs: List[Dict[str, Any]]) -> None:
+        color_widgets = AltairColorWidgets()
+        with instrument() as events:
+            color_widgets.display(synthetic_data(1000), 'z', TestAltairColorWidgets.example_chart)
+            color_widgets.colorscheme.value = 'reds'
+            color_widgets.colorscheme.value = 'blues'
+        interactions = [event for event in events if event.stage == 'interaction']
+        assert [event.cached for event in interactions] == [False, False, True]
+        assert [event.stage for event in events if event.stage in ('serialise', 'display')] == \
+            ['serialise', 'display', 'serialise', 'display', 'display']
+        assert all(event.bytes and event.bytes > 1000 for event in events if event.stage == 'display')
+        # an interaction includes the building, serialisation and display of the chart
+        first = events.index(interactions[0])
+        assert interactions[0].seconds > sum(event.seconds for event in events[:first])
+
+
+class TestImportTime:
+    """Test the cost of importing ways_py for headless (e.g. batch) use."""
+
+    # around three times that on a laptop, most of it importing altair and pandas
+    budget = 1.5
+
+    @staticmethod
+    def import_times(module: str) -> Dict[str, float]:
+        """Cumulative time in seconds to import `module` and each module it imports, from `-X importtime`."""
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True)
+        times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and not line.endswith('imported package'):
+                _, cumulative, name = line[len('import time:'):].split('|')
+                times[name.strip()] = int(cumulative) / 1e6
+        return times
+
+    @staticmethod
+    def test_headless() -> None:
+        times = TestImportTime.import_times('ways_py.ways')
+        # the widget stack is imported only when widgets are used
+        assert not {name.split('.')[0] for name in times} & {'IPython', 'ipywidgets', 'traitlets'}
+        assert times['ways_py.ways'] < TestImportTime.budget
@@ -0,0 +1,157 @@
+"""Batch (headless) rendering of many charts, such as one decorated chart per poll date or candidate."""
+
+import base64
+from concurrent.futures import as_completed, Future, ProcessPoolExecutor
+import json
+import math
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+import altair as alt  # type: ignore
+from altair_saver.savers._selenium import HTML_TEMPLATE, SeleniumSaver  # type: ignore
+from altair_viewer import get_bundled_script  # type: ignore
+
+from ways_py.serialise import to_json
+
+
+# Like altair_saver's, but releasing each view once rendered, since the page is reused
+_RENDER_CODE = """
+const [spec, embedOpt, format, done] = arguments;
+vegaEmbed('#vis', spec, embedOpt)
+    .then(result => {
+        const scale = embedOpt.scaleFactor || 1;
+        const image = format === 'png'
+            ? result.view.toCanvas(scale).then(canvas => canvas.toDataURL('image/png'))
+            : result.view.toSVG(scale);
+        return image.finally(() => result.finalize());
+    })
+    .then(result => done({result}))
+    .catch(err => done({error: err.toString()}));
+"""
+
+
+class BatchResult(NamedTuple):
+    """Outcome of rendering one chart of a batch."""
+
+    params: Dict[str, Any]
+    path: str
+    build_seconds: float
+    """Time taken to make the chart and build its Vega-Lite spec."""
+    render_seconds: float
+    """Time taken to render the spec (if needed) and write it to `path`."""
+    error: Optional[BaseException] = None
+
+
+class SeleniumRenderer:
+    """Renders Vega-Lite specs to SVG or PNG in one long-lived headless browser page.
+
+    Uses altair_saver's web driver and altair_viewer's bundled Vega libraries, but, unlike `chart.save`,
+    loads the page (and the libraries) only once, rather than once per chart. This relies on internals of
+    altair_saver's `SeleniumSaver`, so the version of altair_saver is pinned.
+    """
+
+    def __init__(self, webdriver: Optional[str] = None, driver_timeout: int = 20,
+                 embed_options: Optional[Dict[str, Any]] = None) -> None:
+        self.webdriver = webdriver
+        self.driver_timeout = driver_timeout
+        self.embed_options = {**(embed_options or {}), 'mode': 'vega-lite'}
+        self._driver: Any = None
+
+    def _page(self) -> Any:
+        """Web driver with the page loaded."""
+        if self._driver is None:
+            webdriver = self.webdriver or SeleniumSaver._select_webdriver(self.driver_timeout)
+            if webdriver is None:
+                raise RuntimeError("No web driver (chromedriver or geckodriver) available for rendering.")
+            self._driver = SeleniumSaver._registry.get(webdriver, self.driver_timeout)
+            versions = {'vega': alt.VEGA_VERSION, 'vega-lite': alt.VEGALITE_VERSION,
+                        'vega-embed': alt.VEGAEMBED_VERSION}
+            url = SeleniumSaver._serve(
+                HTML_TEMPLATE.format(vega_url='/vega.js', vegalite_url='/vega-lite.js',
+                                     vegaembed_url='/vega-embed.js'),
+                {f'{name}.js': get_bundled_script(name, version) for name, version in versions.items()}
+            )
+            self._driver.get(url)
+        return self._driver
+
+    def render(self, spec: Dict[str, Any], fmt: str) -> Union[str, bytes]:
+        """Render `spec` as SVG (a string) or PNG (bytes)."""
+        result = self._page().execute_async_script(_RENDER_CODE, spec, self.embed_options, fmt)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        if fmt == 'png':
+            return base64.b64decode(result['result'].split(',', 1)[1].encode())
+        return str(result['result'])
+
+
+def _build(make_chart: Callable[..., Any], params: Dict[str, Any]) -> Tuple[str, float]:
+    """Make a chart and serialise it; runs in a worker process."""
+    start = time.perf_counter()
+    try:
+        spec = to_json(make_chart(**params))
+    except Exception as e:
+        # an exception which can't be unpickled (such as a schema validation error) would break the pool
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+        raise
+    return spec, time.perf_counter() - start
+
+
+def _write(spec: str, path: str, renderer: Any) -> None:
+    fmt = os.path.splitext(path)[1][1:].lower()
+    if fmt == 'json':
+        content: Union[str, bytes] = spec
+    elif fmt in ('svg', 'png'):
+        content = renderer.render(json.loads(spec), fmt)
+    else:
+        raise ValueError(f"Unsupported format {fmt}; expected json, svg or png.")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb' if isinstance(content, bytes) else 'w') as f:
+        f.write(content)
+
+
+def render_batch(make_chart: Callable[..., Any], params: Iterable[Dict[str, Any]],
+                 path: Union[str, Callable[..., str]], processes: Optional[int] = None,
+                 renderer: Any = None) -> Iterator[BatchResult]:
+    """Make, render and save a chart for each set of parameters, yielding the results as each is saved.
+
+    The charts (`make_chart(**p)` for each `p` in `params`) are made and serialised across a pool of
+    `processes` worker processes (by default one per CPU; 0 to work in this process), so `make_chart`
+    must be picklable, e.g. a module-level function decorated with `altair_color_viz`. Each spec is then
+    rendered, as it arrives, by a single long-lived `renderer` (by default a `SeleniumRenderer`), and
+    written to the file given by `path`, which is a format string (`"charts/{date}.svg"`) or a function
+    of the parameters. The format (`json`, `svg` or `png`) is taken from the file extension.
+
+    A chart which fails is reported by the `error` of its result, rather than stopping the batch.
+    """
+    renderer = renderer or SeleniumRenderer()
+    path_of: Callable[..., str] = path.format if isinstance(path, str) else path
+
+    def result(p: Dict[str, Any], build: Callable[[], Tuple[str, float]]) -> BatchResult:
+        try:
+            spec, build_seconds = build()
+        except Exception as e:
+            return BatchResult(p, path_of(**p), math.nan, math.nan, e)
+        start = time.perf_counter()
+        try:
+            _write(spec, path_of(**p), renderer)
+        except Exception as e:
+            return BatchResult(p, path_of(**p), build_seconds, time.perf_counter() - start, e)
+        return BatchResult(p, path_of(**p), build_seconds, time.perf_counter() - start)
+
+    if processes == 0:
+        for p in params:
+            yield result(p, lambda: _build(make_chart, p))
+        return
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures: Dict[Future[Tuple[str, float]], Dict[str, Any]] = {
+            pool.submit(_build, make_chart, p): p for p in params
+        }
+        for future in as_completed(futures):
+            yield result(futures[future], future.result)
@@ -0,0 +1,196 @@
+"""Geographic data for choropleths, as simplified and quantised TopoJSON joined to its attributes by key."""
+
+import json
+from typing import Any, cast, Dict, List, Optional, Sequence, Tuple
+
+import altair as alt  # type: ignore
+import numpy as np
+import numpy.typing as npt
+import pandas as pd  # type: ignore
+from shapely.geometry import LineString  # type: ignore
+
+Codes = npt.NDArray[np.int64]
+"""Quantised points, each encoded as a single integer."""
+
+
+def pixel_tolerance(bounds: Sequence[float], width: float, height: float, pixels: float = 1) -> float:
+    """Simplification tolerance, in data units, for detail of `pixels` pixels when `bounds` fill the view.
+
+    Args:
+    bounds: (minx, miny, maxx, maxy) of the region to be displayed.
+    width: width in pixels of the view.
+    height: height in pixels of the view.
+    pixels: size in pixels of the smallest detail to keep.
+    """
+    minx, miny, maxx, maxy = bounds
+    return pixels * max((maxx - minx) / width, (maxy - miny) / height)
+
+
+def _polygons(geom: Any) -> List[Any]:
+    if geom is None or geom.is_empty:
+        return []
+    if geom.geom_type == 'Polygon':
+        return [geom]
+    if geom.geom_type == 'MultiPolygon':
+        return list(geom.geoms)
+    raise ValueError(f"Unsupported geometry type {geom.geom_type}; expected Polygon or MultiPolygon.")
+
+
+class _Grid:
+    """A square grid of (up to) `quantization` x `quantization` points covering the given bounds.
+
+    Grid points are encoded as single integers. The grid is square so that distances (for simplification)
+    are the same in both directions.
+    """
+
+    def __init__(self, bounds: Sequence[float], quantization: int) -> None:
+        x0, y0, x1, y1 = bounds
+        self.quantization = quantization
+        self.translate = [float(x0), float(y0)]
+        self.step = float(max(x1 - x0, y1 - y0)) / (quantization - 1) or 1
+        self.scale = [self.step, self.step]
+
+    def ring(self, ring: Any) -> Codes:
+        """A ring as grid points, without its closing point or any points made coincident by quantising."""
+        ixy = np.round((np.asarray(ring.coords)[:, :2] - self.translate) / self.scale).astype(np.int64)
+        codes: Codes = ixy[:, 0] * self.quantization + ixy[:, 1]
+        codes = codes[np.append(True, codes[1:] != codes[:-1])]
+        return codes[:-1] if len(codes) > 1 and codes[0] == codes[-1] else codes
+
+    def polygons(self, geom: Any) -> List[List[Codes]]:
+        """Rings of each polygon of a geometry, less any polygons or holes which quantising collapses."""
+        polygons = []
+        for polygon in _polygons(geom):
+            rings = [self.ring(ring) for ring in [polygon.exterior, *polygon.interiors]]
+            if len(np.unique(rings[0])) >= 3:
+                polygons.append([ring for ring in rings if len(np.unique(ring)) >= 3])
+        return polygons
+
+    def xy(self, codes: Codes) -> npt.NDArray[np.int64]:
+        """Grid coordinates of grid points."""
+        return np.stack(np.divmod(codes, self.quantization), axis=1)
+
+
+def _junctions(rings: List[Codes]) -> Codes:
+    """Points at which two rings (or one ring, twice) arrive or leave in different directions."""
+    if not rings:
+        return np.zeros(0, dtype=np.int64)
+    points = np.concatenate(rings)
+    prev = np.concatenate([np.roll(ring, 1) for ring in rings])
+    next = np.concatenate([np.roll(ring, -1) for ring in rings])
+    neighbours = np.unique(np.stack([points, np.minimum(prev, next), np.maximum(prev, next)], axis=1), axis=0)
+    values, counts = np.unique(neighbours[:, 0], return_counts=True)
+    return cast(Codes, values[counts > 1])
+
+
+class _Arcs:
+    """The distinct arcs of a topology, each a sequence of grid points shared by every ring which uses it."""
+
+    def __init__(self, junctions: Codes) -> None:
+        self.junctions = junctions
+        self.arcs: List[Codes] = []
+        self._index: Dict[bytes, int] = {}
+
+    def _arc(self, arc: Codes) -> int:
+        """Index of `arc`, or ~index of its reverse, adding it if it is new."""
+        key = arc.tobytes()
+        if key not in self._index:
+            reverse_key = arc[::-1].tobytes()
+            if reverse_key in self._index:
+                return ~self._index[reverse_key]
+            self._index[key] = len(self.arcs)
+            self.arcs.append(arc)
+        return self._index[key]
+
+    def ring(self, ring: Codes) -> List[int]:
+        """Cut a ring, given without its closing point, into arcs at its junctions."""
+        cuts = np.flatnonzero(np.isin(ring, self.junctions))
+        if len(cuts) == 0:
+            # a ring with no junctions is a single arc; start it at its least point, so that it is shared
+            # with any other ring using the same points
+            ring = np.roll(ring, -int(np.argmin(ring)))
+            return [self._arc(np.append(ring, ring[0]))]
+        ring = np.roll(ring, -int(cuts[0]))
+        closed = np.append(ring, ring[0])
+        ends = list(cuts - cuts[0]) + [len(ring)]
+        return [self._arc(closed[start:end + 1]) for start, end in zip(ends, ends[1:])]
+
+
+def _encode_arc(xy: npt.NDArray[np.int64], tolerance: float) -> List[List[int]]:
+    """Simplify an arc to within `tolerance` grid units, and delta-encode it, as TopoJSON requires."""
+    if tolerance > 0 and len(xy) > 2:
+        simplified = np.asarray(LineString(xy).simplify(tolerance).coords, dtype=np.int64)
+        # a closed arc (a whole ring) must keep enough points to remain a ring
+        if (xy[0] != xy[-1]).any() or len(simplified) >= 4:
+            xy = simplified
+    deltas: List[List[int]] = np.diff(xy, axis=0, prepend=[[0, 0]]).tolist()
+    return deltas
+
+
+def topojson(data: pd.DataFrame, key: str, tolerance: float = 0, quantization: int = 100_000,
+             object_name: str = 'features') -> Dict[str, Any]:
+    """Convert the (Multi)Polygon geometries of a GeoDataFrame to a TopoJSON topology.
+
+    Coordinates are quantised to a grid of `quantization` points across the bounds of the data, and
+    the rings are cut into arcs where they meet, so that a border shared by two polygons is stored once.
+    Each arc is then simplified to within `tolerance` (in data units, as from `pixel_tolerance`), which
+    keeps shared borders consistent, unlike simplifying each polygon separately. The geometry for each row
+    has the row's value of `key` as its id.
+    """
+    grid = _Grid(data.total_bounds if len(data) else (0, 0, 0, 0), quantization)
+    polygons = [grid.polygons(geom) for geom in data.geometry]
+    arcs = _Arcs(_junctions([ring for rings_by_polygon in polygons for rings in rings_by_polygon
+                             for ring in rings]))
+    geometries = []
+    for id, rings_by_polygon in zip(data[key], polygons):
+        id = id.item() if isinstance(id, np.generic) else id
+        geometry: Dict[str, Any] = {'id': id, 'properties': {key: id}}
+        polygon_arcs = [[arcs.ring(ring) for ring in rings] for rings in rings_by_polygon]
+        if len(polygon_arcs) == 0:
+            geometry['type'] = None
+        elif len(polygon_arcs) == 1:
+            geometry.update(type='Polygon', arcs=polygon_arcs[0])
+        else:
+            geometry.update(type='MultiPolygon', arcs=polygon_arcs)
+        geometries.append(geometry)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': grid.scale, 'translate': grid.translate},
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': [_encode_arc(grid.xy(arc), tolerance / grid.step) for arc in arcs.arcs]
+    }
+
+
+def geometry_lookup(data: pd.DataFrame, key: str, width: float, height: float,
+                    bounds: Optional[Sequence[float]] = None, pixels: float = 1, quantization: int = 100_000,
+                    filename: Optional[str] = None) -> Tuple[pd.DataFrame, Any]:
+    """Split a GeoDataFrame into its attributes and its (simplified, TopoJSON) geometries, joined by `key`.
+
+    Each distinct geometry is stored once, however many rows (e.g. dates or candidates) share it, simplified
+    for display in a `width` x `height` view of `bounds` (by default the bounds of the data). The geometries
+    are inline data or, if `filename` is given, are saved there and referenced by URL, so that they need not
+    be sent again as the attributes change. Plot with `geoshape_lookup`.
+
+    Returns:
+        The attributes (`data` without its geometry column), and the geometries as Altair data.
+    """
+    geometries = data.drop_duplicates(subset=[key])
+    if bounds is None:
+        bounds = geometries.total_bounds
+    topology = topojson(geometries, key, pixel_tolerance(bounds, width, height, pixels), quantization)
+    if filename is None:
+        geo_data = alt.InlineData(values=topology, format=alt.DataFormat(type='topojson', feature='features'))
+    else:
+        with open(filename, 'w') as f:
+            json.dump(topology, f, separators=(',', ':'))
+        geo_data = alt.topo_feature(filename, 'features')
+    return pd.DataFrame(data.drop(columns=data.geometry.name)), geo_data
+
+
+def geoshape_lookup(chart: alt.Chart, key: str, geo_data: Any) -> alt.Chart:
+    """Plot each row of a chart's attribute data as a geoshape, with the geometry from `geometry_lookup`."""
+    return chart \
+        .mark_geoshape() \
+        .transform_lookup(lookup=key, from_=alt.LookupData(data=geo_data, key='id'), as_='geo') \
+        .encode(shape='geo:G')
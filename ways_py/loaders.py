@@ -0,0 +1,121 @@
+"""Datasets loaded from source files (e.g. CSV or GeoJSON) through a cached columnar copy.
+
+Parsing a text format is slow, so the first load of a source file converts it to an Arrow IPC (Feather)
+file in a cache directory (see `cache_dir`), and later loads memory-map that copy instead. The copy is named
+by the source's path, modification time and size, so it is remade whenever the source changes. Rows can be
+filtered while still in Arrow form, before they are converted to pandas (see `load_csv`), so that selecting,
+e.g., one date of a large table, and then joining it to geometry, costs milliseconds.
+
+Requires pyarrow (and geopandas, for `load_geo`).
+"""
+
+import hashlib
+import os
+from typing import Any, Callable, Mapping, Optional, Sequence
+
+import pandas as pd  # type: ignore
+
+from ways_py.transport import _table, _write
+
+
+def cache_dir() -> str:
+    """Directory for cached datasets: `$WAYS_PY_CACHE`, or else `ways_py` in the user's cache directory."""
+    return os.environ.get('WAYS_PY_CACHE') or \
+        os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'ways_py')
+
+
+def _hash(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()[:12]
+
+
+def cached_path(source: str, directory: Optional[str] = None, options: Any = None) -> str:
+    """Path of the cached copy of `source` (which may not have been made yet).
+
+    Args:
+    source: path of the source file.
+    directory: cache directory; by default `cache_dir()`.
+    options: anything else (e.g. parser options) on which the content of the copy depends.
+    """
+    stat = os.stat(source)
+    version = f'{stat.st_mtime_ns}:{stat.st_size}:{options!r}'
+    name = f'{os.path.basename(source)}-{_hash(os.path.abspath(source))}-{_hash(version)}.arrow'
+    return os.path.join(directory or cache_dir(), name)
+
+
+def _cached(source: str, read: Callable[[str], Any], write: Callable[[Any, str], None],
+            directory: Optional[str], options: Any) -> str:
+    """The cached copy of `source`, first made (with `read` then `write`) if not up to date.
+
+    Copies of earlier versions of `source` are removed.
+    """
+    path = cached_path(source, directory, options)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = read(source)
+        _write(path, lambda tmp: write(data, tmp))
+        prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+        for name in os.listdir(os.path.dirname(path)):
+            if name.startswith(prefix) and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(os.path.dirname(path), name))
+                except FileNotFoundError:
+                    # already removed by another process
+                    pass
+    return path
+
+
+def _write_arrow(data: pd.DataFrame, path: str) -> None:
+    import pyarrow as pa  # type: ignore
+    table = _table(data)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _filter(table: Any, filters: Mapping[str, Any]) -> Any:
+    """Rows of an Arrow table whose value in each column of `filters` is (or is one of) the given value(s)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc  # type: ignore
+    mask = None
+    for column, value in filters.items():
+        values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+        test = pc.is_in(table[column], value_set=pa.array(values, type=table.schema.field(column).type))
+        mask = test if mask is None else pc.and_(mask, test)
+    return table if mask is None else table.filter(mask)
+
+
+def load_csv(source: str, filters: Optional[Mapping[str, Any]] = None,
+             columns: Optional[Sequence[str]] = None, directory: Optional[str] = None,
+             **options: Any) -> pd.DataFrame:
+    """Load a CSV file, through a cached (and memory-mapped) Arrow copy.
+
+    Args:
+    source: path of the CSV file.
+    filters: keep only the rows whose value in each of these columns is the given value, or one of the
+        given list of values; applied before the rows are converted to pandas.
+    columns: load only these columns.
+    directory: cache directory; by default `cache_dir()`.
+    options: passed to `pd.read_csv`, which parses the file when the copy is made.
+    """
+    import pyarrow as pa
+    path = _cached(source, lambda source: pd.read_csv(source, **options), _write_arrow, directory, options)
+    with pa.memory_map(path) as file:
+        table = _filter(pa.ipc.open_file(file).read_all(), filters or {})
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas(split_blocks=True)
+
+
+def load_geo(source: str, directory: Optional[str] = None, **options: Any) -> Any:
+    """Load a geographic data file (e.g. GeoJSON) as a GeoDataFrame, through a cached Feather copy.
+
+    Args:
+    source: path of the file.
+    directory: cache directory; by default `cache_dir()`.
+    options: passed to `gpd.read_file`, which reads the file when the copy is made.
+    """
+    import geopandas as gpd  # type: ignore
+
+    def write(data: Any, path: str) -> None:
+        data.to_feather(path)
+    path = _cached(source, lambda source: gpd.read_file(source, **options), write, directory, options)
+    return gpd.read_feather(path, memory_map=True)
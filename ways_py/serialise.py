@@ -0,0 +1,144 @@
+"""Fast serialisation of (decorated) Altair charts to Vega-Lite JSON."""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import altair as alt  # type: ignore
+import numpy as np
+import pandas as pd  # type: ignore
+
+from ways_py.ways import _data_rows, _listeners, _stage, _transformer_lock
+
+# Hashes of the (data-free) specs which have already been validated against the Vega-Lite schema.
+_validated: Set[str] = set()
+
+
+def records_json(data: pd.DataFrame) -> str:
+    """Rows of a DataFrame as a JSON array of records, equivalent to those of Altair's data transformer.
+
+    Rather than building a Python dict per row and then encoding those, the columns are written directly by
+    pandas' JSON writer. The geometries of a GeoDataFrame are written as GeoJSON features with the other
+    columns as their properties, as in `alt.utils.sanitize_geo_interface`.
+    """
+    if hasattr(data, '__geo_interface__'):
+        return _geo_records_json(data)
+    if not any(dtype.kind == 'f' for dtype in data.dtypes):
+        return str(data.to_json(orient='records', date_format='iso'))
+    return '[' + ','.join(_records(data)) + ']'
+
+
+def _records(data: pd.DataFrame) -> List[str]:
+    """Rows of a DataFrame as JSON objects, with floats written in full.
+
+    pandas' JSON writer keeps at most 15 decimal places (so 1e-7 / 3 keeps only 8 significant digits), so
+    float columns are instead written with the shortest text that round-trips, as by `json.dumps`, and
+    appended to the objects for the other columns.
+    """
+    floats = [name for name, dtype in data.dtypes.items() if dtype.kind == 'f']
+    others = pd.DataFrame(data.drop(columns=floats))
+    if len(others.columns) > 0:
+        rows: List[str] = others.to_json(orient='records', lines=True, date_format='iso').splitlines()
+    else:
+        rows = ['{}'] * len(data)
+    if not floats:
+        return rows
+    keys = [json.dumps(str(name)) + ':' for name in floats]
+    columns = [_float_json(data[name]) for name in floats]
+    return [
+        row[:-1] + (',' if row != '{}' else '') + ','.join(map(str.__add__, keys, values)) + '}'
+        for row, values in zip(rows, zip(*columns))
+    ]
+
+
+def _float_json(column: pd.Series) -> List[str]:
+    """JSON for each value of a float column: the shortest text which round-trips, or null if not finite."""
+    values = column.to_numpy(dtype=float, na_value=np.nan)
+    text = values.astype(str)
+    text[~np.isfinite(values)] = 'null'
+    result: List[str] = text.tolist()
+    return result
+
+
+def _geo_records_json(data: pd.DataFrame) -> str:
+    geometry = data.geometry
+    props = pd.DataFrame(data.drop(columns=geometry.name))
+    rows = _records(props) if len(props.columns) > 0 else ['{}'] * len(data)
+    return '[' + ','.join(
+        row[:-1] + (',' if row != '{}' else '') + '"geometry":' + geom + ',"type":"Feature"}'
+        for row, geom in zip(rows, _geojson(np.asarray(geometry, dtype=object)))
+    ) + ']'
+
+
+def _geojson(geoms: Any) -> List[str]:
+    """Encode an array of shapely geometries as GeoJSON, vectorised where shapely (2.0+) allows."""
+    import shapely  # type: ignore
+    if hasattr(shapely, 'to_geojson'):
+        return ['null' if geom is None else geom for geom in shapely.to_geojson(geoms)]
+    return ['null' if geom is None else json.dumps(geom.__geo_interface__) for geom in geoms]
+
+
+def _records_transformer(data: Any, blocks: Dict[str, str], refs: Dict[int, Dict[str, str]]) -> Any:
+    """Data transformer which serialises each DataFrame once to a named block, returning a reference to it."""
+    if not isinstance(data, pd.DataFrame):
+        return alt.to_values(data)
+    if id(data) not in refs:
+        block = records_json(data)
+        name = 'data-' + hashlib.md5(block.encode()).hexdigest()
+        blocks[name] = block
+        refs[id(data)] = {'name': name}
+    return refs[id(data)]
+
+
+alt.data_transformers.register('ways_py_records', _records_transformer)
+
+
+def normalise_spec(spec: Dict[str, Any], names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """A Vega-Lite spec with its datasets (or the datasets `names`, if given) renamed in order of appearance.
+
+    Dataset names are hashes of their content, computed differently by different serialisers (e.g. Altair's
+    and ours), so renaming them means that specs with the same data are equal, and that specs which differ
+    only in their data have the same form.
+    """
+    text = json.dumps(spec, sort_keys=True)
+    for n, name in enumerate(spec.get('datasets', {}) if names is None else names):
+        text = text.replace(json.dumps(name), json.dumps(f'data-{n}'))
+    normalised: Dict[str, Any] = json.loads(text)
+    return normalised
+
+
+def validate_once(chart: alt.TopLevelMixin, spec: Dict[str, Any], names: Iterable[str] = ()) -> None:
+    """Validate the (data-free) spec for `chart` against the Vega-Lite schema, unless already validated.
+
+    The spec is identified up to the `names` of the datasets it refers to, so that charts which differ only
+    in their data are validated once.
+    """
+    key = hashlib.md5(json.dumps(normalise_spec(spec, names), sort_keys=True).encode()).hexdigest()
+    if key not in _validated:
+        chart.validate(spec)
+        _validated.add(key)
+
+
+def to_json(chart: alt.TopLevelMixin, validate: bool = True, indent: Any = None) -> str:
+    """Serialise `chart` to Vega-Lite JSON; like Altair's but much faster for charts with large data.
+
+    Each DataFrame is serialised only once, however many of the (concatenated) sub-charts use it, into a
+    single top-level dataset. The rest of the spec is validated only if an identical spec hasn't been
+    validated already, and the data is never validated.
+    """
+    with _stage('serialise', rows=_data_rows(chart)) as event:
+        blocks: Dict[str, str] = {}
+        with _transformer_lock, alt.data_transformers.enable('ways_py_records', blocks=blocks, refs={}):
+            spec = chart.to_dict(validate=False)
+        if validate:
+            validate_once(chart, spec, blocks)
+        # serialise the spec with placeholders for the data blocks, and then substitute them
+        placeholders = {name: '\0' + name for name in blocks}
+        if placeholders:
+            spec.setdefault('datasets', {}).update(placeholders)
+        text = json.dumps(spec, indent=indent)
+        for name, placeholder in placeholders.items():
+            text = text.replace(json.dumps(placeholder), blocks[name], 1)
+        if _listeners:
+            event['bytes'] = len(text.encode())
+    return text
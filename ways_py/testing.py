@@ -0,0 +1,125 @@
+"""Approval testing of charts against stored baselines, and a local cache for the datasets they use.
+
+Rendering a chart to SVG (through a headless browser) is by far the slowest part of an approval test, so
+`expect_fig` renders only when the chart's Vega-Lite spec differs from its baseline. Files are written
+atomically, so tests can be run in parallel (e.g. `pytest -n auto` with pytest-xdist).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional, Union
+import urllib.request
+
+import altair as alt  # type: ignore
+
+from ways_py.batch import SeleniumRenderer
+from ways_py.loaders import cache_dir
+from ways_py.serialise import normalise_spec, to_json
+
+# One renderer per (test) process, so that the browser page is loaded only once.
+_renderer: Optional[SeleniumRenderer] = None
+
+
+def spec_hash(spec: Dict[str, Any]) -> str:
+    """Hash of the normalised form of a Vega-Lite spec."""
+    text = json.dumps(normalise_spec(spec), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def write_atomic(filename: str, content: Union[str, bytes]) -> None:
+    """Write a file so that no other process (e.g. a parallel test) ever sees it partly written."""
+    directory = os.path.dirname(filename) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def cached(url: str) -> str:
+    """Local copy of the file at `url`, downloaded only if not already cached."""
+    filename = os.path.join(
+        cache_dir(), hashlib.md5(url.encode()).hexdigest()[:16] + '-' + os.path.basename(url.split('?')[0])
+    )
+    if not os.path.exists(filename):
+        with urllib.request.urlopen(url) as response:
+            write_atomic(filename, response.read())
+    return filename
+
+
+def render_svg(spec: Dict[str, Any]) -> str:
+    """Render a Vega-Lite spec to SVG."""
+    global _renderer
+    if _renderer is None:
+        _renderer = SeleniumRenderer()
+    return str(_renderer.render(spec, 'svg'))
+
+
+def expect_fig(fig: alt.TopLevelMixin, filename: str, headless: bool) -> None:
+    """Check for equivalence to stored output baselines.
+
+    The chart is serialised by `ways_py.serialise.to_json`, and rendered to SVG (by `render_svg`, in a
+    headless browser page kept open by `ways_py.batch.SeleniumRenderer`) only when its spec differs from the
+    baseline. Only then is a web driver (chromedriver or geckodriver) needed.
+
+    For each approval test, there are two expected outputs (a.k.a. "baselines"):
+      - Vega-Lite spec (in JSON format)
+      - SVG image corresponding to Vega-Lite spec
+
+    If the Vega-Lite spec is equivalent to the baseline (see `normalise_spec`), so is the image, and the test
+    passes without rendering it. Otherwise the image is rendered and compared (baselines written by Altair,
+    whose data may differ in the last digits, are therefore rendered once and then rewritten):
+
+    1. A change to the _image_ (which implies that the Vega Lite also changed) is reported as a test failure.
+       To promote to a baseline, move the .new.svg and .new.json files over the corresponding .svg and .json.
+
+    2. Otherwise, the approval test passes. If the Vega Lite has changed, the change is interpreted as a
+       refactoring (since it has no visual consequences). This will generate a revised .json file without
+       the .new prefix, which can simply be committed as usual.
+
+    When a new approval test is run for the first time, the situation is similar to (1) except that there are
+    no preexisting .svg or .json files.
+
+    Some useful `git` aliases are defined in `.gitconfig.aliases` (include the file into your `.gitconfig` to
+    enable):
+
+    - `git approve` renames all .new files so that they overwrite the existing baselines (use with care)
+    - `git reject` discards all .new files
+    """
+    if not headless:
+        fig.show()
+
+    filename_vl, filename_image = filename + '.json', filename + '.svg'
+    have_vl = to_json(fig, indent=2)
+    have_spec = json.loads(have_vl)
+    try:
+        with open(filename_vl) as f:
+            expected_spec: Optional[Dict[str, Any]] = json.load(f)
+    except FileNotFoundError:
+        expected_spec = None
+    if expected_spec is not None and os.path.exists(filename_image) and \
+            spec_hash(expected_spec) == spec_hash(have_spec):
+        print(f"{filename}: Vega-Lite equivalent; image not rendered.")
+        return
+
+    have_image = render_svg(have_spec)
+    try:
+        with open(filename_image) as f:
+            expected_image: Optional[str] = f.read()
+    except FileNotFoundError:
+        expected_image = None
+
+    if expected_image == have_image:
+        print(f"{filename}: Vega-Lite changed; image identical.")
+        write_atomic(filename_vl, have_vl)
+    else:
+        write_atomic(filename + '.new.json', have_vl)
+        write_atomic(filename + '.new.svg', have_image)
+        assert expected_image is not None, f"{filename}: image not found."
+        assert False, f"{filename}: image changed."
@@ -0,0 +1,140 @@
+"""Datasets written once to disk, in a columnar format, and shared by charts, notebooks and batch jobs.
+
+A DataFrame is saved (see `save_dataset`) under a name derived from its content, so saving the same data
+again, from any process, reuses the existing file. Arrow IPC files are uncompressed, so `load_dataset` can
+memory-map them, giving columns which are views of the file rather than copies; Parquet files are smaller,
+but are read into memory.
+
+Vega (as used by Altair 4) reads neither format, so the `ways_py_file` data transformer writes, alongside
+the Arrow file, a CSV copy (with explicit types) for charts to refer to by URL, rather than embedding the
+data as JSON records. Enable it with `alt.data_transformers.enable('ways_py_file', directory=...)`.
+
+Requires pyarrow.
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import Any, Callable, Dict, Optional
+import weakref
+
+import altair as alt  # type: ignore
+import pandas as pd  # type: ignore
+
+_extensions = {'arrow': '.arrow', 'parquet': '.parquet', 'csv': '.csv'}
+
+_hashes: Dict[int, str] = {}
+"""Cache for `dataset_hash`, keyed on DataFrame identity."""
+
+
+def dataset_hash(data: pd.DataFrame) -> str:
+    """Hash of the content (columns, types and values, but not index) of a DataFrame.
+
+    Cached for as long as `data` is alive, so `data` should not be modified in place once hashed.
+    """
+    key = id(data)
+    if key not in _hashes:
+        md5 = hashlib.md5(repr([(str(name), str(dtype)) for name, dtype in data.dtypes.items()]).encode())
+        md5.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+        _hashes[key] = md5.hexdigest()
+        # evict when data is garbage-collected, as its id may then be reused
+        weakref.finalize(data, _hashes.pop, key, None)
+    return _hashes[key]
+
+
+def _write(filename: str, write: Callable[[str], None]) -> None:
+    """Write a file (with `write`) unless it exists, so that no other process ever sees it partly written."""
+    if os.path.exists(filename):
+        return
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or '.', prefix='.' + os.path.basename(filename))
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _table(data: pd.DataFrame) -> Any:
+    """A DataFrame as an Arrow table; numeric columns without nulls share their buffers with `data`."""
+    import pyarrow as pa  # type: ignore
+    return pa.Table.from_pandas(pd.DataFrame(data), preserve_index=False)
+
+
+def save_dataset(data: pd.DataFrame, directory: str = '.', format: str = 'arrow') -> str:
+    """Save a DataFrame as Arrow IPC (`format='arrow'`), Parquet or CSV, unless already saved.
+
+    Returns:
+        The path of the file, `<directory>/data-<hash><extension>`, named by `dataset_hash`.
+    """
+    if format not in _extensions:
+        raise ValueError(f"Unsupported format {format}; expected one of {', '.join(_extensions)}.")
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, f'data-{dataset_hash(data)}{_extensions[format]}')
+
+    def write(path: str) -> None:
+        table = _table(data)
+        if format == 'arrow':
+            import pyarrow as pa
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        elif format == 'parquet':
+            import pyarrow.parquet as pq  # type: ignore
+            pq.write_table(table, path)
+        else:
+            import pyarrow.csv as csv  # type: ignore
+            csv.write_csv(table, path)
+    _write(filename, write)
+    return filename
+
+
+def load_dataset(path: str) -> pd.DataFrame:
+    """Load a DataFrame saved by `save_dataset`, memory-mapping it if it is an Arrow IPC file.
+
+    The numeric columns (without nulls) of a memory-mapped file are read-only views of the file, which the
+    operating system shares between all the processes which load it.
+    """
+    import pyarrow as pa
+    if path.endswith(_extensions['parquet']):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=True).to_pandas()
+    if path.endswith(_extensions['csv']):
+        import pyarrow.csv as csv
+        return csv.read_csv(path).to_pandas()
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+
+
+def _parse(dtype: Any) -> Optional[str]:
+    """Vega's type for parsing a CSV column with pandas type `dtype`, if not a string."""
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'boolean'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'number'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'date'
+    return None
+
+
+def file_transformer(data: Any, directory: str = '.', url_prefix: str = '') -> Any:
+    """Altair data transformer which saves each DataFrame once (see `save_dataset`) and refers to it by URL.
+
+    The data is saved as Arrow IPC, for Python readers (e.g. batch jobs), and as CSV, for Vega, which the
+    chart refers to by `url_prefix` plus the file name. GeoDataFrames, and other data, are embedded as usual.
+
+    Args:
+    data: data of a chart.
+    directory: where to save the files.
+    url_prefix: URL of `directory`, as seen from where the chart is displayed, ending in '/'; by default
+        the file name alone, which suits charts displayed in a notebook in `directory`.
+    """
+    if not isinstance(data, pd.DataFrame) or hasattr(data, '__geo_interface__'):
+        return alt.to_values(data)
+    save_dataset(data, directory, 'arrow')
+    filename = save_dataset(data, directory, 'csv')
+    parse = {str(name): _parse(dtype) for name, dtype in data.dtypes.items() if _parse(dtype)}
+    return {'url': url_prefix + os.path.basename(filename), 'format': {'type': 'csv', 'parse': parse}}
+
+
+alt.data_transformers.register('ways_py_file', file_transformer)
@@ -1,11 +1,26 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
-from typing import Any, Callable, cast, TypeVar
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from typing import (
+    Any, Callable, cast, Dict, Hashable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
+)
+import uuid
+import warnings
+import weakref
 
 import altair as alt  # type: ignore
-from IPython.display import display  # type: ignore
-from ipywidgets import Box, Layout, widgets  # type: ignore
+from altair.utils.schemapi import debug_mode  # type: ignore
+import numpy as np
+import numpy.typing as npt
 import pandas as pd  # type: ignore
-import traitlets  # type: ignore
 
 
 def is_defined(v: Any) -> bool:
@@ -13,6 +28,281 @@ def is_defined(v: Any) -> bool:
     return type(v).__name__ != 'UndefinedType'
 
 
+class ColumnStats(NamedTuple):
+    """Summary statistics of a column, ignoring nulls; `min` and `max` are NaN if there are no values."""
+
+    min: Any
+    max: Any
+    value_count: int
+    null_count: int
+
+
+_column_stats: Dict[Tuple[int, str], ColumnStats] = {}
+"""Cache for `column_stats`, keyed on DataFrame identity and column name."""
+
+
+def column_stats(data: pd.DataFrame, column: str) -> ColumnStats:
+    """Minimum, maximum, number of values and number of nulls in a column of a DataFrame.
+
+    Computed with vectorised NumPy reductions rather than by iterating over the column, and cached for as long
+    as `data` is alive, so `data` should not be modified in place once its statistics have been requested.
+    """
+    key = (id(data), column)
+    if key not in _column_stats:
+        ys = data[column]
+        nulls = ys.isna().to_numpy()
+        null_count = int(nulls.sum())
+        values = ys.to_numpy()[~nulls] if null_count else ys.to_numpy()
+        if len(values) == 0:
+            stats = ColumnStats(math.nan, math.nan, 0, null_count)
+        else:
+            # Python scalars, as with the builtin min and max
+            min_, max_ = values.min(), values.max()
+            stats = ColumnStats(
+                min_.item() if isinstance(min_, np.generic) else min_,
+                max_.item() if isinstance(max_, np.generic) else max_,
+                len(values),
+                null_count
+            )
+        _column_stats[key] = stats
+        # evict when data is garbage-collected, as its id may then be reused
+        weakref.finalize(data, _column_stats.pop, key, None)
+    return _column_stats[key]
+
+
+def multi_column_stats(data: pd.DataFrame, columns: Sequence[str]) -> Dict[str, ColumnStats]:
+    """`column_stats` of several columns, computed together in one vectorised pass over the numeric ones.
+
+    The statistics are cached (as by `column_stats`) for as long as `data` is alive.
+    """
+    numeric = [column for column in columns if (id(data), column) not in _column_stats and
+               pd.api.types.is_numeric_dtype(data[column]) and not pd.api.types.is_bool_dtype(data[column])]
+    if numeric:
+        values = data[numeric].to_numpy(dtype=float, na_value=np.nan)
+        nulls = np.isnan(values).sum(axis=0)
+        with warnings.catch_warnings():
+            # all-null columns
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mins, maxs = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        for i, column in enumerate(numeric):
+            # of the column's type (and as Python scalars), as from column_stats
+            to_type = data[column].dtype.type
+            min_, max_ = (math.nan, math.nan) if nulls[i] == len(data) \
+                else (to_type(mins[i]).item(), to_type(maxs[i]).item())
+            key = (id(data), column)
+            _column_stats[key] = ColumnStats(min_, max_, len(data) - int(nulls[i]), int(nulls[i]))
+            # evict when data is garbage-collected, as its id may then be reused
+            weakref.finalize(data, _column_stats.pop, key, None)
+    return {column: column_stats(data, column) for column in columns}
+
+
+def bin_params(extent: Tuple[float, float], maxbins: int = 10, base: float = 10,
+               divide: Sequence[float] = (5, 2), minstep: float = 0, step: Optional[float] = None,
+               steps: Optional[Sequence[float]] = None, nice: bool = True) -> Tuple[float, float, float]:
+    """Start, stop and step of the bins Vega would choose for the given extent.
+
+    A port of `bin` from vega-statistics, taking the same parameters as alt.Bin. The default `maxbins` is
+    Vega-Lite's default for the bin transform; some encoding channels (e.g. color) default to 6 instead.
+    """
+    min_, max_ = extent
+    span = (max_ - min_) or abs(min_) or 1
+    logb = math.log(base)
+    if step is None:
+        if steps:
+            # limit choice to acceptable step sizes
+            i = 0
+            while i < len(steps) and steps[i] < span / maxbins:
+                i += 1
+            step = steps[max(0, i - 1)]
+        else:
+            # JavaScript's Math.round rounds halves up, unlike Python's round
+            level = math.ceil(math.log(maxbins) / logb)
+            step = max(minstep, base ** (math.floor(math.log(span) / logb + 0.5) - level))
+            # increase step size if too many bins
+            while math.ceil(span / step) > maxbins:
+                step *= base
+            # decrease step size if allowed
+            for div in divide:
+                v = step / div
+                if v >= minstep and span / v <= maxbins:
+                    step = v
+    v = math.log(step)
+    precision = 0 if v >= 0 else int(-v / logb) + 1
+    eps = base ** (-precision - 1)
+    if nice:
+        v = math.floor(min_ / step + eps) * step
+        min_ = v - step if min_ < v else v
+        max_ = math.ceil(max_ / step) * step
+    return min_, (min_ + step if max_ == min_ else max_), step
+
+
+def _bin_kwargs(bin: Any) -> Dict[str, Any]:
+    """Keyword arguments for `bin_params` specified by an alt.Bin (or `True`)."""
+    if bin is True:
+        return {}
+    names = ['maxbins', 'base', 'divide', 'minstep', 'step', 'steps', 'nice']
+    return {name: getattr(bin, name) for name in names if is_defined(getattr(bin, name))}
+
+
+def vega_bin_params(ys: pd.Series, bin: Any,
+                    extent: Optional[Tuple[Any, Any]] = None) -> Tuple[float, float, float]:
+    """Start, stop and step of the bins the Vega-Lite bin transform uses for `ys`.
+
+    Args:
+        ys: values to bin, which must include at least one non-null value.
+        bin: alt.Bin (or `True`) specifying the bins; if it has no extent, the extent of `ys` is used.
+        extent: minimum and maximum of `ys`, if already known (e.g. from `column_stats`).
+    """
+    if bin is not True and is_defined(bin.extent):
+        extent = bin.extent
+    elif extent is None:
+        extent = (ys.min(), ys.max())
+    start, stop, step = bin_params(extent, **_bin_kwargs(bin))
+    # as in Vega's Bin transform, which also aligns the bins with `anchor`
+    stop = start + math.ceil((stop - start) / step) * step
+    anchor = alt.Undefined if bin is True else bin.anchor
+    if is_defined(anchor):
+        offset = anchor - (start + step * math.floor((anchor - start) / step))
+        start, stop = start + offset, stop + offset
+    return start, stop, step
+
+
+def vega_bins(ys: pd.Series, bin: Any, params: Optional[Tuple[float, float, float]] = None
+              ) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """Start and end of the bin which the Vega-Lite bin transform assigns to each value of `ys`.
+
+    Args:
+        ys: values to bin.
+        bin: alt.Bin (or `True`) specifying the bins; if it has no extent, the extent of `ys` is used.
+        params: start, stop and step of the bins (see `vega_bin_params`), if already known, in which case
+            `bin` is ignored; e.g. to bin more values into the bins of an earlier call.
+
+    Returns:
+        Bin starts and ends, with NaN for null values and for values outside the bins.
+    """
+    values = ys.to_numpy(dtype=float, na_value=np.nan)
+    if np.isnan(values).all():
+        return values.copy(), values.copy()
+    start, stop, step = vega_bin_params(ys, bin) if params is None else params
+    starts = start + step * np.floor(1e-14 + (np.clip(values, start, stop - step) - start) / step)
+    starts[(values < start) | (values > stop)] = np.nan
+    return starts, start + step * (1 + (starts - start) / step)
+
+
+def multi_bin_counts(data: pd.DataFrame,
+                     bins: Sequence[Tuple[str, Tuple[float, float, float]]]) -> List[pd.DataFrame]:
+    """Bin counts (as from `AltairColorViz.bin_counts`) of several numeric columns, in one vectorised pass.
+
+    Args:
+        data: data with the columns to bin.
+        bins: pairs of column and the start, stop and step of its bins (see `vega_bin_params`); a column
+            can be binned in several ways.
+
+    Returns:
+        Counts for each of `bins`, equal to those of `AltairColorViz.bin_counts(data[column], True, params)`.
+    """
+    if not bins:
+        return []
+    columns = list(dict.fromkeys(column for column, _ in bins))
+    values = data[columns].to_numpy(dtype=float, na_value=np.nan)[:, [columns.index(c) for c, _ in bins]]
+    start, stop, step = (np.array(p) for p in zip(*(params for _, params in bins)))
+    # as in vega_bins, for every column at once
+    index = np.floor(1e-14 + (np.clip(values, start, stop - step) - start) / step)
+    index[(values < start) | (values > stop)] = np.nan
+    sizes = np.floor(1e-14 + (stop - step - start) / step).astype(int) + 1
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    counted = ~np.isnan(index)
+    counts = np.bincount((index + offsets[:-1])[counted].astype(int), minlength=offsets[-1])
+    result = []
+    for i in range(len(bins)):
+        k = np.flatnonzero(counts[offsets[i]:offsets[i + 1]])
+        starts = start[i] + step[i] * k.astype(float)
+        result.append(pd.DataFrame({
+            'bin_start': starts,
+            'bin_end': start[i] + step[i] * (1 + (starts - start[i]) / step[i]),
+            'count': counts[offsets[i] + k]
+        }))
+    return result
+
+
+class Event(NamedTuple):
+    """A stage of building, serialising or displaying a chart, as recorded by `instrument`."""
+
+    stage: str
+    """One of 'density_chart', 'used_colours', 'sample', 'concat', 'serialise', 'display', 'interaction' or
+    'append'."""
+    seconds: float
+    rows: Optional[int] = None
+    """Number of rows of the data being plotted."""
+    bytes: Optional[int] = None
+    """For 'serialise', size of the serialised chart; for 'display', of the payload sent to the front end."""
+    cached: Optional[bool] = None
+    """For 'interaction', whether the chart was already rendered (see `AltairColorWidgets.display`)."""
+
+
+_listeners: List[Callable[[Event], None]] = []
+"""Callbacks of the active `instrument` contexts."""
+
+
+@contextmanager
+def instrument(callback: Optional[Callable[[Event], None]] = None) -> Iterator[List[Event]]:
+    """Record the time taken by each stage of decorating, serialising and displaying charts, and their sizes.
+
+    Within the context, an `Event` for each stage is appended to the list returned by the context manager, and
+    passed to `callback` if given; e.g. `with instrument() as events: ...`, then `pd.DataFrame(events)`. The
+    stages are those of `AltairColorViz.decorate`, the serialisation of a chart (by `mimebundle` or
+    `ways_py.serialise.to_json`, and so for `AltairColorWidgets` and `ways_py.batch.render_batch`) and, for
+    each interaction with `AltairColorWidgets`, the display of the chart and the latency of the whole
+    interaction (from the first widget change to the chart being displayed). Outside any `instrument`
+    context, nothing is timed or measured.
+    """
+    events: List[Event] = []
+
+    def listener(event: Event) -> None:
+        events.append(event)
+        if callback is not None:
+            callback(event)
+    _listeners.append(listener)
+    try:
+        yield events
+    finally:
+        _listeners.remove(listener)
+
+
+@contextmanager
+def _stage(stage: str, start: Optional[float] = None, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """Record the enclosed code as an `Event` for `stage`, if instrumented, with `fields` added to the event.
+
+    Further fields can be added to the yielded dict. The stage is timed from `start` (a `time.perf_counter`
+    time), if given, rather than from entering the context.
+    """
+    if not _listeners:
+        yield fields
+        return
+    start = time.perf_counter() if start is None else start
+    yield fields
+    event = Event(stage, time.perf_counter() - start, **fields)
+    for listener in list(_listeners):
+        listener(event)
+
+
+def _payload_size(bundle: Dict[str, Any]) -> int:
+    """Size in bytes of the content of a mimebundle."""
+    return sum(len((content if isinstance(content, str) else json.dumps(content)).encode())
+               for content in bundle.values())
+
+
+def _data_rows(chart: Any) -> Optional[int]:
+    """Number of rows of the largest DataFrame of a chart and its sub-charts (such as a decorated chart's)."""
+    data = getattr(chart, 'data', None)
+    rows = [len(data)] if isinstance(data, pd.DataFrame) else []
+    for key in ('hconcat', 'vconcat', 'concat', 'layer'):
+        subcharts = getattr(chart, key, None)
+        if isinstance(subcharts, list):
+            rows += [n for n in map(_data_rows, subcharts) if n is not None]
+    return max(rows, default=None)
+
+
 class AltairColorViz:
     """Meta-visualisation for alt.Color object.
 
@@ -27,62 +317,149 @@ class AltairColorViz:
         return cast(str, src.encoding.color.shorthand)
 
     @staticmethod
-    def density_chart(src: alt.Chart) -> alt.Chart:
-        """The underlying distribution of the chart as a histogram; placed alongside 'colours used'."""
-        if src.encoding.color.bin:
-            if is_defined(src.encoding.color.bin.extent):
-                extent = src.encoding.color.bin.extent
-                bin = alt.Bin(maxbins=100, extent=extent)
-                y_scale = alt.Scale(domain=extent, nice=True)
-            else:
-                bin = alt.Bin(maxbins=100)
-                y_scale = alt.Scale(zero=False, nice=True)
-        else:
-            bin = alt.Bin(maxbins=100)
-            y_scale = alt.Scale(nice=False)
-        ys = src.data[AltairColorViz._field(src)]  # assume src.data array-like in an appropriate way
-        y_min, y_max = min(ys), max(ys)
+    def bin_counts(ys: pd.Series, bin: Any,
+                   params: Optional[Tuple[float, float, float]] = None) -> pd.DataFrame:
+        """Number of values of `ys` in each bin, where the bins are as Vega-Lite would compute them.
+
+        Returns one row per non-empty bin, ordered by bin, with columns `bin_start`, `bin_end` and `count`.
+        Null values, and values outside the bins, are not counted. See `vega_bins` for `params`.
+        """
+        starts, ends = vega_bins(ys, bin, params)
+        return pd.DataFrame({'bin_start': starts, 'bin_end': ends}) \
+            .groupby(['bin_start', 'bin_end']) \
+            .size() \
+            .reset_index(name='count')
+
+    @staticmethod
+    def _bin_counts(data: pd.DataFrame, field: str, bin: Any) -> pd.DataFrame:
+        """`bin_counts` of a column, taken from running counts if `data` is that of a `StreamingData`."""
+        streaming = _streaming_data(data, field)
+        return AltairColorViz.bin_counts(data[field], bin) if streaming is None \
+            else streaming.bin_counts(field, bin)
+
+    @staticmethod
+    def _value_counts(data: pd.DataFrame, field: str) -> pd.Series:
+        """Number of rows with each value (including null) of a column, in order of first appearance.
+
+        Taken from running counts if `data` is that of a `StreamingData`.
+        """
+        streaming = _streaming_data(data, field)
+        return data[field].value_counts(sort=False, dropna=False) if streaming is None \
+            else streaming.value_counts(field)
+
+    @staticmethod
+    def _density_bin(color: alt.Color) -> Tuple[alt.Bin, alt.Scale]:
+        """Bins of the density chart for a colour encoding, and the scale of its y axis."""
+        if color.bin:
+            if is_defined(color.bin.extent):
+                extent = color.bin.extent
+                return alt.Bin(maxbins=100, extent=extent), alt.Scale(domain=extent, nice=True)
+            return alt.Bin(maxbins=100), alt.Scale(zero=False, nice=True)
+        return alt.Bin(maxbins=100), alt.Scale(nice=False)
+
+    @staticmethod
+    def density_chart(src: alt.Chart, precompute: bool = False,
+                      hist: Optional[pd.DataFrame] = None) -> alt.Chart:
+        """The underlying distribution of the chart as a histogram; placed alongside 'colours used'.
+
+        If `precompute` is set, the histogram is computed here rather than by Vega-Lite, so that the chart
+        embeds one row per bin rather than the whole of `src.data`; or, if given, `hist` (with columns
+        `bin_start`, `bin_end` and `proportion`, and perhaps others, as from `decorate_facets`) is plotted.
+        """
+        field = AltairColorViz._field(src)
+        bin, y_scale = AltairColorViz._density_bin(src.encoding.color)
+        y_min, y_max, value_count, _ = column_stats(src.data, field)
         # tickCount/tickMinStep Axis properties are ignored (perhaps because we specify bins), so hard code
+        if precompute:
+            # bins already computed, so encode them directly (giving the step, as that determines the labels);
+            # no values, so no bins (or step), if the column is all null
+            y_bin = alt.Bin(binned=True)
+            if value_count > 0:
+                y_bin.step = vega_bin_params(src.data[field], bin, extent=(y_min, y_max))[2]
+            y_field, x_field = 'bin_start:Q', 'proportion:Q'
+        else:
+            y_field, y_bin, x_field = src.encoding.color.shorthand, bin, 'sum(proportion):Q'
         y_axis = alt.Y(
-            src.encoding.color.shorthand,
-            bin=bin,
+            y_field,
+            bin=y_bin,
             axis=alt.Axis(orient='left', grid=False, values=sorted([0, 50] + [y_min, y_max])),
             title=src.encoding.color.shorthand,
             scale=y_scale
         )
         x_axis = alt.X(
-            'sum(proportion):Q',
+            x_field,
             sort='descending',
             axis=alt.Axis(grid=False),
             title="density"
         )
         # Title for both the density_chart and used_colours plots
         title = "Colours used"
-        return alt.Chart(src.data, title=title) \
-            .transform_joinaggregate(total='count(*)') \
-            .transform_calculate(proportion="1 / datum.total") \
+        if precompute:
+            if hist is None:
+                # proportion of all rows, as with count(*) in Vega-Lite
+                hist = AltairColorViz._bin_counts(src.data, field, bin)
+                hist['proportion'] = hist.pop('count') / len(src.data)
+            chart = alt.Chart(hist, title=title) \
+                .encode(y_axis, x_axis, y2='bin_end:Q')
+        else:
+            chart = alt.Chart(src.data, title=title) \
+                .transform_joinaggregate(total='count(*)') \
+                .transform_calculate(proportion="1 / datum.total") \
+                .encode(y_axis, x_axis)
+        return chart \
             .mark_bar(color='gray') \
-            .encode(y_axis, x_axis) \
             .properties(width=100, height=300)
 
     @staticmethod
-    def used_colours(src: alt.Chart) -> alt.Chart:
-        """The colours used by the chart, plotted as another (vertical) chart."""
+    def used_colours(src: alt.Chart, shared_data: bool = False, precompute: bool = False,
+                     max_values: int = 1000, colours: Optional[pd.DataFrame] = None) -> alt.Chart:
+        """The colours used by the chart, plotted as another (vertical) chart.
+
+        The non-binned variant embeds the distinct values of the colour column. If there are more than
+        `max_values` of them, it embeds only `max_values` of them, at evenly spaced quantiles (see
+        `quantile_values`), which on a 300 pixel high chart look the same. If `shared_data` is set, it
+        instead deduplicates `src.data` with a Vega-Lite aggregate, so the chart can read the same dataset
+        as `src`.
+
+        If `precompute` is set, the binned variant computes the bins here rather than in Vega-Lite, so that
+        the chart embeds one row per bin rather than the whole of `src.data`.
+
+        If given, `colours` is plotted rather than rows computed from `src.data`: for the binned variant
+        with `precompute`, one row per bin (with columns `y`, `y2` and the colour field), and for the
+        non-binned variant, one row per value of the colour field (e.g. as from `decorate_facets`).
+        """
         y_axis = alt.Axis(orient='right', grid=False)
         x_axis = alt.Axis(labels=False, tickSize=0, grid=False, titleAngle=270, titleAlign='right')
+        color = src.encoding.color
         if src.encoding.color.bin:
             if is_defined(src.encoding.color.bin.extent):
                 extent = src.encoding.color.bin.extent
                 y_scale = alt.Scale(domain=extent, nice=True)
             else:
                 y_scale = alt.Scale(zero=False, nice=True)
-            chart = alt.Chart(src.data) \
-                .mark_rect() \
-                .transform_bin(
-                    as_=['y', 'y2'],
-                    bin=src.encoding.color.bin,
-                    field=AltairColorViz._field(src)
-                ) \
+            if precompute:
+                field = AltairColorViz._field(src)
+                if colours is None:
+                    bins = AltairColorViz._bin_counts(src.data, field, src.encoding.color.bin)
+                    colours = pd.DataFrame({'y': bins.bin_start, 'y2': bins.bin_end})
+                    # colour each bin by its midpoint
+                    colours[field] = (colours.y + colours.y2) / 2
+                # fix the colour bins' extent to that of the original data
+                if not is_defined(color.bin.extent):
+                    color = color.copy()
+                    stats = column_stats(src.data, field)
+                    color.bin.extent = [stats.min, stats.max]
+                chart = alt.Chart(colours) \
+                    .mark_rect()
+            else:
+                chart = alt.Chart(src.data) \
+                    .mark_rect() \
+                    .transform_bin(
+                        as_=['y', 'y2'],
+                        bin=src.encoding.color.bin,
+                        field=AltairColorViz._field(src)
+                    )
+            chart = chart \
                 .transform_calculate(x='5') \
                 .encode(
                     y=alt.Y('y:Q', axis=y_axis, title="", scale=y_scale),
@@ -91,51 +468,605 @@ class AltairColorViz:
                 )
         else:
             y_scale = alt.Scale(nice=False)
-            # Get a dataframe to plot where there is only one row for each unique value
-            # of the column of the source chart data being plotted
-            df = src.data.drop_duplicates(subset=[src.encoding.color.shorthand])
-            chart = alt.Chart(df) \
+            if colours is not None:
+                chart = alt.Chart(colours)
+            elif shared_data:
+                # Same as below, but computed in Vega so that no second copy of the data is embedded
+                chart = alt.Chart(src.data) \
+                    .transform_aggregate(groupby=[AltairColorViz._field(src)])
+            else:
+                # Plot only the colour column, with one row for each distinct value (in order of first
+                # appearance), or for a sample of them if there are too many
+                counts = AltairColorViz._value_counts(src.data, AltairColorViz._field(src))
+                values = counts.index if len(counts) <= max_values \
+                    else AltairColorViz.quantile_values(counts, max_values)
+                chart = alt.Chart(pd.DataFrame({AltairColorViz._field(src): values}))
+            chart = chart \
                 .mark_bar() \
                 .encode(
                     y=alt.Y(src.encoding.color.shorthand, axis=y_axis, title="", scale=y_scale),
                     x=alt.X('count()', sort='descending', axis=x_axis, title="")
                 )
-        return chart.encode(src.encoding.color) \
+        return chart.encode(color) \
                     .properties(width=20, height=300)
 
     @staticmethod
-    def decorate(src: alt.Chart) -> alt.Chart:
+    def quantile_values(counts: pd.Series, n: int) -> pd.Index:
+        """Up to `n` of the values counted by `counts` (as from `value_counts`), at evenly spaced quantiles.
+
+        The quantiles are of all the counted rows, so a frequent value is more likely to be chosen than a
+        rare one. The least and greatest values are always chosen. Nulls are ignored.
+        """
+        counts = counts[counts.index.notna()].sort_index()
+        if len(counts) == 0:
+            return counts.index
+        cumulative = counts.to_numpy().cumsum()
+        # the value of the row of each rank, counting from 1
+        positions = np.searchsorted(cumulative, np.linspace(1, cumulative[-1], n))
+        return counts.index[np.unique(positions)]
+
+    @staticmethod
+    def _with_fixed_colour(src: alt.Chart) -> alt.Chart:
+        """Copy of `src` with its colour bins' extent, or scale domain, fixed to the extent of `src.data`.
+
+        An extent or domain already given is kept; otherwise any subset of `src.data` is coloured alike.
+        """
+        field = AltairColorViz._field(src)
+        stats = column_stats(src.data, field)
+        color = src.encoding.color.copy()
+        if color.bin:
+            if not is_defined(color.bin.extent):
+                color.bin.extent = [stats.min, stats.max]
+        elif pd.api.types.is_numeric_dtype(src.data[field]) and stats.value_count > 0:
+            scale = alt.Scale() if not is_defined(color.scale) else color.scale
+            if not is_defined(scale.domain):
+                scale.domain = [stats.min, stats.max]
+            color.scale = scale
+        chart = src.copy(deep=False)
+        chart.encoding = src.encoding.copy(deep=False)
+        chart.encoding.color = color
+        return chart
+
+    @staticmethod
+    def sample(src: alt.Chart, max_rows: int) -> alt.Chart:
+        """Copy of `src` plotting a random sample of `max_rows` rows of its data, in their original order.
+
+        The colour scale is fixed to the extent of the whole of `src.data`, so that the sample is coloured
+        just as the full data would be.
+        """
+        chart = AltairColorViz._with_fixed_colour(src)
+        # sample positions rather than index labels, which needn't be in order (or sortable)
+        rows = len(src.data)
+        positions = np.sort(np.random.default_rng(0).choice(rows, min(max_rows, rows), replace=False))
+        chart.data = src.data.iloc[positions]
+        return chart
+
+    @staticmethod
+    def decorate(src: alt.Chart, shared_data: bool = False, precompute: bool = False,
+                 max_rows: Optional[int] = None, sample: bool = True, max_values: int = 1000,
+                 facet: Optional[str] = None) -> alt.Chart:
         """Decorate a colour-ended Altair chart with meta-visualisations showing how the colours are used.
 
         Args:
         src: colour-encoded Altair chart to be decorated.
+        shared_data: store `src.data` once, as the data of the top-level chart, and have every sub-chart
+            read it from there, rather than giving each sub-chart its own data.
+        precompute: compute the meta-visualisations' aggregates in Python, embedding only the results.
+        max_rows: row budget. If `src.data` has more rows, the meta-visualisations are computed in Python
+            (as for `precompute`) from all of the data, so they embed no more than one row per bin or colour.
+        sample: if `src.data` exceeds `max_rows`, plot a random sample of `max_rows` rows in the decorated
+            chart (see `sample`) rather than the whole of `src.data`, which Altair would refuse to embed
+            (with `MaxRowsError`) unless its row limit has been raised or disabled.
+        max_values: for a non-binned colour, the most distinct values to plot in the 'colours used' chart;
+            see `used_colours`.
+        facet: field by which to group the rows of `src.data`, decorating each group as a small multiple;
+            see `decorate_facets` (which always precomputes, and ignores `max_rows` and `sample`).
+
+        Returns:
+            Altair chart object: modified chart
+        """
+        if not is_defined(src.encoding.color.bin):
+            raise Exception("Can only apply decorator to chart with color.bin defined.")
+        if facet is not None:
+            return AltairColorViz.decorate_facets(src, facet, max_values=max_values)
+
+        rows = len(src.data)
+        over_budget = max_rows is not None and rows > max_rows
+        # over budget, the meta-visualisations embed aggregates rather than reading src.data
+        precompute = precompute or over_budget
+        with _stage('density_chart', rows=rows):
+            density_chart = AltairColorViz.density_chart(src, precompute=precompute)
+        with _stage('used_colours', rows=rows):
+            used_colours = AltairColorViz.used_colours(
+                src, shared_data=shared_data and not over_budget, precompute=precompute, max_values=max_values
+            )
+        if over_budget and sample:
+            with _stage('sample', rows=rows):
+                src = AltairColorViz.sample(src, cast(int, max_rows))
+        with _stage('concat', rows=len(src.data)):
+            if shared_data:
+                charts = [density_chart, used_colours, src.copy(deep=False)]
+                for chart in charts:
+                    # precomputed aggregates keep their own (small) data
+                    if chart.data is src.data:
+                        chart.data = alt.Undefined
+                decorated: alt.Chart = alt.hconcat(*charts, data=src.data)
+            else:
+                meta_chart: alt.Chart = density_chart | used_colours
+                decorated = meta_chart | src
+            return decorated \
+                .configure_view(strokeWidth=0) \
+                .configure_concat(spacing=5)
+
+    @staticmethod
+    def _group_bin_counts(data: pd.DataFrame, groupby: str, field: str, bin: Any) -> pd.DataFrame:
+        """Number of rows of each group of `data` in each bin of `field`, in one pass over the rows.
+
+        The bins are those of the whole of `data`, so are shared by the groups; columns are `groupby`,
+        `bin_start`, `bin_end` and `count`, sorted by group then bin, omitting empty bins and null groups.
+        """
+        ys = data[field]
+        stats = column_stats(data, field)
+        params = vega_bin_params(ys, bin, extent=(stats.min, stats.max)) if stats.value_count else None
+        starts, ends = vega_bins(ys, bin, params)
+        bins = pd.DataFrame({groupby: data[groupby].to_numpy(), 'bin_start': starts, 'bin_end': ends})
+        return bins.groupby([groupby, 'bin_start', 'bin_end']).size().reset_index(name='count')
+
+    @staticmethod
+    def _group_values(data: pd.DataFrame, groupby: str, field: str, max_values: int) -> pd.DataFrame:
+        """Distinct values of `field` in each group of `data`, in one pass over the rows.
+
+        Groups with more than `max_values` distinct values are represented by `max_values` of them (see
+        `quantile_values`); columns are `groupby` and `field`, omitting null groups.
+        """
+        counts = data[[groupby, field]].groupby([groupby, field], sort=False, dropna=False).size()
+        counts = counts[counts.index.get_level_values(0).notna()]
+        distinct = counts.groupby(level=0, sort=False).size()
+        values = counts.index.to_frame(index=False)
+        large = distinct.index[distinct > max_values]
+        if len(large) == 0:
+            return values
+        return pd.concat([values[~values[groupby].isin(large)]] + [
+            pd.DataFrame({groupby: group, field: AltairColorViz.quantile_values(counts[group], max_values)})
+            for group in large
+        ], ignore_index=True)
+
+    @staticmethod
+    def decorate_facets(src: alt.Chart, groupby: str, max_values: int = 1000) -> alt.Chart:
+        """Decorate each group of rows of a colour-encoded chart (e.g. each date) as a small multiple.
+
+        The groups share the colour scheme and bins of the whole of `src.data` (see `sample`), and the
+        meta-visualisations' aggregates (as with `precompute`) are computed for every group at once, by a
+        grouped pass over all of the rows, so the cost grows with the number of rows rather than groups ×
+        rows. `src.data` and each table of aggregates are embedded once, with each small multiple filtering
+        them to its group. The small multiples are stacked vertically, in order of group; rows with a null
+        `groupby` are omitted.
+
+        Args:
+        src: colour-encoded Altair chart to be decorated.
+        groupby: field of `src.data` by which to group the rows.
+        max_values: for a non-binned colour, the most distinct values to plot in each 'colours used' chart.
 
         Returns:
             Altair chart object: modified chart
         """
         if not is_defined(src.encoding.color.bin):
             raise Exception("Can only apply decorator to chart with color.bin defined.")
+        field = AltairColorViz._field(src)
+        if groupby == field:
+            raise ValueError(f"Can't group by the colour field {field!r}.")
+
+        src = AltairColorViz._with_fixed_colour(src)
+        color = src.encoding.color
+        data = src.data
+        rows = len(data)
+        sizes = data[groupby].value_counts().sort_index()
+        with _stage('density_chart', rows=rows):
+            bin = AltairColorViz._density_bin(color)[0]
+            hist = AltairColorViz._group_bin_counts(data, groupby, field, bin)
+            # proportion of each group's rows
+            hist['proportion'] = hist.pop('count') / hist[groupby].map(sizes)
+        with _stage('used_colours', rows=rows):
+            if color.bin:
+                bins = AltairColorViz._group_bin_counts(data, groupby, field, color.bin)
+                colours = pd.DataFrame({groupby: bins[groupby], 'y': bins.bin_start, 'y2': bins.bin_end})
+                colours[field] = (colours.y + colours.y2) / 2
+            else:
+                colours = AltairColorViz._group_values(data, groupby, field, max_values)
+        with _stage('concat', rows=rows):
+            charts = [
+                AltairColorViz.density_chart(src, precompute=True, hist=hist),
+                AltairColorViz.used_colours(src, precompute=True, max_values=max_values, colours=colours),
+                src
+            ]
+            multiples = []
+            # the spec is validated as a whole by to_dict, so needn't be as each of (perhaps) many filters
+            # is added, which would cost more than the aggregation
+            with debug_mode(False):
+                for group in sizes.index:
+                    predicate = alt.FieldEqualPredicate(
+                        field=groupby, equal=group.item() if isinstance(group, np.generic) else group
+                    )
+                    multiples.append(alt.hconcat(
+                        *[chart.transform_filter(predicate) for chart in charts], title=f"{groupby} = {group}"
+                    ))
+            return alt.vconcat(*multiples) \
+                .configure_view(strokeWidth=0) \
+                .configure_concat(spacing=5)
+
+
+_streaming: Dict[Tuple[int, str], 'weakref.ReferenceType[StreamingData]'] = {}
+"""The `StreamingData` whose `data` each DataFrame is, keyed on DataFrame identity and column name."""
+
+
+def _streaming_data(data: Any, column: str) -> Optional['StreamingData']:
+    """The (live) `StreamingData` whose `data` is `data`, with running aggregates of `column`, if any."""
+    ref = _streaming.get((id(data), column))
+    return None if ref is None else ref()
+
+
+class StreamingData:
+    """A DataFrame to which batches of rows are appended, with running aggregates of its (colour) columns.
+
+    The aggregates plotted by the meta-visualisations (the counts of each bin, for the density chart and a
+    binned colour, and of each value, for a non-binned colour) and the columns' statistics are updated from
+    each appended batch, rather than recomputed from all of the rows. Bins whose extent is that of the data
+    are recomputed from all of the rows only when a batch extends the data beyond the current bins.
+
+    `column_stats`, and `AltairColorViz` when it precomputes the meta-visualisations (e.g. `decorate` with
+    `precompute`), use the running aggregates for charts of `data`. See also `AltairColorWidgets.append`.
+    """
+
+    def __init__(self, data: pd.DataFrame, columns: Union[str, Sequence[str]], max_bins: int = 8) -> None:
+        """Start with the rows of `data`, keeping running counts for up to `max_bins` sets of bins per column.
+
+        The statistics of all of `columns` (a column, or a list of them) are computed together; see
+        `multi_column_stats`.
+        """
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.max_bins = max_bins
+        self.stats = multi_column_stats(data, self.columns)
+        self._chunks = [data]
+        self._data: Optional[pd.DataFrame] = data
+        self._register(data)
+        self._bins: Dict[str, OrderedDict[Tuple[float, float, float], pd.DataFrame]] = \
+            {column: OrderedDict() for column in self.columns}
+        self._values: Dict[str, pd.Series] = {}
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """All of the rows so far, as one DataFrame (a new one after each `append`)."""
+        if self._data is None:
+            self._data = pd.concat(self._chunks, ignore_index=True)
+            self._chunks = [self._data]
+            self._register(self._data)
+        return self._data
+
+    def _register(self, data: pd.DataFrame) -> None:
+        """Make the statistics and aggregates available to `column_stats` and `AltairColorViz` for `data`."""
+        for column in self.columns:
+            key = (id(data), column)
+            _column_stats[key] = self.stats[column]
+            _streaming[key] = weakref.ref(self)
+            # evict when data is garbage-collected, as its id may then be reused
+            weakref.finalize(data, _column_stats.pop, key, None)
+            weakref.finalize(data, _streaming.pop, key, None)
+
+    def _unregister(self, data: pd.DataFrame) -> None:
+        """Stop using the running aggregates (which now include more rows) for `data`."""
+        for column in self.columns:
+            key = (id(data), column)
+            if _streaming_data(data, column) is self:
+                del _streaming[key]
+
+    def append(self, rows: pd.DataFrame) -> None:
+        """Append a batch of rows (with the same columns), updating the aggregates from the batch alone."""
+        batches = multi_column_stats(rows, self.columns)
+        for column in self.columns:
+            stats, batch = self.stats[column], batches[column]
+            if batch.value_count == 0:
+                values = stats[:2]
+            elif stats.value_count == 0:
+                values = batch[:2]
+            else:
+                values = (min(stats.min, batch.min), max(stats.max, batch.max))
+            self.stats[column] = ColumnStats(*values, stats.value_count + batch.value_count,
+                                             stats.null_count + batch.null_count)
+            ys = rows[column]
+            # each set of bins is fixed, so its counts stay correct for all of the rows, although data whose
+            # extent has grown is binned differently (see bin_counts)
+            bins = self._bins[column]
+            for params, counts in bins.items():
+                bins[params] = self._add_counts(counts, AltairColorViz.bin_counts(ys, True, params))
+            if column in self._values:
+                self._values[column] = \
+                    pd.concat([self._values[column], ys.value_counts(sort=False, dropna=False)]) \
+                    .groupby(level=0, sort=False, dropna=False) \
+                    .sum()
+        self._chunks.append(rows)
+        if self._data is not None:
+            # superseded by the concatenation of all of the rows
+            self._unregister(self._data)
+        self._data = None
 
-        meta_chart: alt.Chart = (AltairColorViz.density_chart(src) | AltairColorViz.used_colours(src))
-        return (meta_chart | src) \
-            .configure_view(strokeWidth=0) \
-            .configure_concat(spacing=5)
+    @staticmethod
+    def _add_counts(counts: pd.DataFrame, more: pd.DataFrame) -> pd.DataFrame:
+        """Sum of two sets of counts of the same bins, as from `AltairColorViz.bin_counts`."""
+        return pd.concat([counts, more]) \
+            .groupby(['bin_start', 'bin_end'], as_index=False)['count'] \
+            .sum()
+
+    def _params(self, column: str, bin: Any) -> Tuple[float, float, float]:
+        stats = self.stats[column]
+        return vega_bin_params(self._chunks[0][column], bin, extent=(stats.min, stats.max))
+
+    def _cache(self, column: str, params: Tuple[float, float, float], counts: pd.DataFrame) -> None:
+        bins = self._bins[column]
+        bins[params] = counts
+        bins.move_to_end(params)
+        # forget the least recently used
+        if len(bins) > self.max_bins:
+            bins.popitem(last=False)
+
+    def bin_counts(self, column: str, bin: Any) -> pd.DataFrame:
+        """`AltairColorViz.bin_counts` of a column, for all of the rows so far.
+
+        Computed from all of the rows only for bins not yet counted (see also `precompute_bins`), and
+        otherwise taken from the running counts.
+        """
+        if self.stats[column].value_count == 0:
+            return AltairColorViz.bin_counts(self.data[column], bin)
+        params = self._params(column, bin)
+        if params in self._bins[column]:
+            self._bins[column].move_to_end(params)
+        else:
+            self._cache(column, params, AltairColorViz.bin_counts(self.data[column], bin, params))
+        return self._bins[column][params].copy()
+
+    def precompute_bins(self, bins: Sequence[Tuple[str, Any]]) -> None:
+        """Count the bins of numeric columns, for `bin_counts`, in one vectorised pass over all of them.
+
+        Args:
+            bins: pairs of column and alt.Bin (or `True`), of which there may be several for a column.
+        """
+        bins = [(column, bin) for column, bin in bins if self.stats[column].value_count > 0]
+        params = [self._params(column, bin) for column, bin in bins]
+        counted = multi_bin_counts(self.data, [(column, p) for (column, _), p in zip(bins, params)])
+        for (column, _), p, counts in zip(bins, params, counted):
+            self._cache(column, p, counts)
+
+    def value_counts(self, column: str) -> pd.Series:
+        """Number of rows with each value (including null) of a column so far, in first-appearance order."""
+        if column not in self._values:
+            self._values[column] = self.data[column].value_counts(sort=False, dropna=False)
+        return self._values[column].copy()
 
 
 FuncT = TypeVar("FuncT", bound=Callable[..., Any])
 """Type variable for internal module use."""
 
 
-def altair_color_viz(make_chart: FuncT) -> FuncT:
+def altair_color_viz(make_chart: Optional[FuncT] = None, **options: Any) -> Any:
     """Decorator which attaches an AltairColorViz meta-visualisation to a colour-encoded Altair chart.
 
     Given a function which creates an Altair chart using an alt.Color object for colour encoding, adapt
     that function to return the original chart decorated with an AltairColorViz meta-visualisation.
+
+    Can be used bare (`@altair_color_viz`) or with keyword options for `AltairColorViz.decorate`, as in
+    `@altair_color_viz(shared_data=True)`.
+    """
+    def decorator(make_chart: FuncT) -> FuncT:
+        @wraps(make_chart)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return AltairColorViz.decorate(make_chart(*args, **kwargs), **options)
+        return cast(FuncT, wrapper)
+
+    if make_chart is None:
+        return decorator
+    return decorator(make_chart)
+
+
+def _shared_data_transformer(data: Any, source: Any, shared: Dict[str, Any],
+                             default: Callable[[Any], Any]) -> Any:
+    """Altair data transformer using `shared` (already transformed) for `source`, and `default` otherwise."""
+    return shared if data is source else default(data)
+
+
+alt.data_transformers.register('ways_py_shared', _shared_data_transformer)
+
+_transformer_lock = threading.RLock()
+"""Held while a data transformer is enabled to serialise a chart (see `AltairColorWidgets` and
+`ways_py.serialise.to_json`), as Altair's data transformer setting is global, so that serialisations in
+different threads (e.g. of asynchronous widgets) don't use, or restore, one another's transformers."""
+
+_executor: Optional[ThreadPoolExecutor] = None
+"""Thread in which `AltairColorWidgets` build and serialise charts asynchronously; see `display`."""
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """The running asyncio event loop (e.g. Jupyter's), if any."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class Debounced:
+    """Calls a function once for each burst of requests, `wait` seconds after the last request in the burst.
+
+    A request supersedes any call still waiting to happen. Requests made by the function itself (for example
+    by setting a widget value) are ignored. Requests made while `hold` is in effect result in a single call
+    when the outermost `hold` ends. Without a running asyncio event loop (e.g. outside Jupyter), or if `wait`
+    is 0, calls are made as soon as they are requested.
     """
-    @wraps(make_chart)
-    def wrapper(*args: Any, **kwargs: Any) -> Any:
-        return AltairColorViz.decorate(make_chart(*args, **kwargs))
-    return cast(FuncT, wrapper)
+
+    def __init__(self, func: Callable[[], None], wait: float = 0) -> None:
+        self.func = func
+        self.wait = wait
+        self.calls = 0
+        """Number of calls of `func` made so far."""
+        self.requested: Optional[float] = None
+        """Time (`time.perf_counter`) of the first request since the last call, i.e. of the current burst."""
+        self._pending = False
+        self._calling = False
+        self._holds = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __call__(self, *args: Any) -> None:
+        """Request a call; any arguments (e.g. from a traitlets observer) are ignored."""
+        if self._calling:
+            return
+        if not self._pending:
+            self.requested = time.perf_counter()
+        self._pending = True
+        if self._holds == 0:
+            self._schedule()
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        """Coalesce all requests made within the context into (at most) one call."""
+        self._holds += 1
+        try:
+            yield
+        finally:
+            self._holds -= 1
+            if self._holds == 0 and self._pending:
+                self._schedule()
+
+    def flush(self) -> None:
+        """Make any pending call now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            self._pending = False
+            self._calling = True
+            try:
+                self.func()
+                self.calls += 1
+            finally:
+                self._calling = False
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop = _running_loop()
+        if loop is None or self.wait == 0:
+            self.flush()
+        else:
+            self._timer = loop.call_later(self.wait, self.flush)
+
+
+class ChartCache:
+    """Least-recently-used cache of rendered charts, with hit and miss counts."""
+
+    def __init__(self, maxsize: int = 16) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """The entry for `key`, if there is one, counting it as most recently used."""
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Add an entry, evicting the least recently used entry if the cache is full."""
+        if self.maxsize > 0:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def data_fingerprint(data: pd.DataFrame, column: str) -> Tuple[Any, ...]:
+    """Cheap fingerprint of a DataFrame column: its identity and shape, and a hash of a sample of values."""
+    ys = data[column]
+    sample = ys.iloc[np.linspace(0, len(ys) - 1, min(len(ys), 64)).astype(int)]
+    return id(data), data.shape, column, int(pd.util.hash_pandas_object(sample, index=False).sum())
+
+
+def mimebundle(chart: alt.TopLevelMixin) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Rendered form of a chart (as used by IPython), which can be displayed again with `raw=True`."""
+    with _stage('serialise', rows=_data_rows(chart)) as event:
+        bundle = chart._repr_mimebundle_(None, None)
+        rendered = bundle if isinstance(bundle, tuple) else (bundle, {})
+        if _listeners:
+            event['bytes'] = _payload_size(rendered[0])
+    return rendered
+
+
+class DataFile:
+    """JSON file of the data displayed by a widget (see `AltairColorWidgets.display`), to add rows to.
+
+    The file is written as by Altair's json data transformer, but under a name of its own (rather than one
+    named by the content of the data, which may be shared with other charts of it), so that rows can be
+    added to it in place, and so that it can be removed when no longer needed: by `remove`, when the object
+    is garbage collected, or at exit.
+
+    Args:
+    data: data to write.
+    directory: where to write the file.
+    url_prefix: URL of `directory`, as seen from where the chart is displayed, ending in '/'; by default
+        the file name alone, which suits charts displayed in a notebook in `directory`.
+    """
+
+    def __init__(self, data: pd.DataFrame, directory: str = '.', url_prefix: str = '') -> None:
+        self._prefix = os.path.join(directory, f'altair-data-{uuid.uuid4().hex[:8]}')
+        self._url_prefix = url_prefix
+        self._files: List[str] = []
+        self.remove = weakref.finalize(self, DataFile._remove, self._files)
+        self._write(data)
+
+    @staticmethod
+    def _remove(files: List[str]) -> None:
+        for filename in files:
+            if os.path.exists(filename):
+                os.remove(filename)
+        files.clear()
+
+    def _write(self, data: pd.DataFrame) -> None:
+        # with no urlpath, Altair's URL is the file name
+        url_data = alt.to_json(data, prefix=self._prefix)
+        self.filename: str = url_data['url']
+        self._files.append(self.filename)
+        url = self._url_prefix + os.path.basename(self.filename)
+        self.url_data: Dict[str, Any] = {**url_data, 'url': url}
+
+    def append(self, rows: pd.DataFrame, data: pd.DataFrame) -> None:
+        """Add `rows` to the file, whose content is then `data`, and update `url_data` to refer to it.
+
+        The rows are written to the end of the file (in place), so only they are serialised and written; the
+        URL changes (with a query string) so that the front end doesn't reuse its copy of the file. GeoJSON,
+        which isn't an array of records, is rewritten (to a new file) from all of `data`.
+        """
+        if hasattr(rows, '__geo_interface__'):
+            self._write(data)
+            return
+        records = alt.utils.sanitize_dataframe(rows).to_json(orient='records', double_precision=15)
+        if records != '[]':
+            with open(self.filename, 'r+b') as f:
+                f.seek(-1, 2)
+                # replace the closing ']' (preceded by a record unless the file is '[]')
+                empty = f.tell() == 1
+                f.write((records[1:] if empty else ',' + records[1:]).encode())
+        url = self._url_prefix + os.path.basename(self.filename)
+        self.url_data = {**self.url_data, 'url': f"{url}?rows={len(data)}"}
+
+
+def display(*objs: Any, **kwargs: Any) -> None:
+    """Display objects with IPython, which (like ipywidgets) is imported only when widgets are used."""
+    from IPython.display import display as ipython_display  # type: ignore
+    ipython_display(*objs, **kwargs)
 
 
 class AltairColorWidgets:
@@ -143,6 +1074,9 @@ class AltairColorWidgets:
 
     def __init__(self) -> None:
         """Create Jupyter widgets that can be used as input to Altair color object in a Jupyter notebook."""
+        from ipywidgets import Box, Layout, widgets  # type: ignore
+        import traitlets  # type: ignore
+
         # Checkbox widget that determines whether binning is enabled
         self.bin = widgets.RadioButtons(value='Binned',
                                         options=['Binned', 'Continuous'],
@@ -232,6 +1166,17 @@ class AltairColorWidgets:
 
         self.bin.observe(bin_options, names='value')
 
+        # the data being displayed, (with `incremental`) its file, and the widgets displayed; see display
+        self._stream: Optional[StreamingData] = None
+        self._data_file: Optional[DataFile] = None
+        self._displayed: List[Any] = []
+        # charts being built asynchronously (see display): the number of renders so far, so that a chart can
+        # tell whether it has been superseded, and the task building the latest chart
+        self._generation = 0
+        self._task: Optional[asyncio.Task[None]] = None
+        # extent widget values last set from the data, by get_altair_color_obj or append
+        self._data_extent: Optional[Tuple[int, int]] = None
+
     def get_altair_color_obj(self, data: pd.DataFrame, column: str) -> alt.Color:
         """Build color object for Altair plot from widget selections.
 
@@ -245,9 +1190,11 @@ class AltairColorWidgets:
         # If the bin checkbox selected
         if self.bin.value == 'Binned':
             # If not already set, set the default values of the extent widget to data min and max
-            if self.extentmax.value == 0:
-                self.extentmin.value = data[column].min()
-                self.extentmax.value = data[column].max()
+            stats = column_stats(data, column)
+            if self.extentmax.value == 0 and stats.value_count > 0:
+                self.extentmin.value = stats.min
+                self.extentmax.value = stats.max
+                self._data_extent = (self.extentmin.value, self.extentmax.value)
             # create the altair bin object from widget values
             bin = alt.Bin(maxbins=self.maxbins.value, extent=[self.extentmin.value, self.extentmax.value])
         else:
@@ -272,23 +1219,52 @@ class AltairColorWidgets:
             scale = alt.Scale(type=self.scale.value, range=colorrange)
         return alt.Color(column, legend=None, bin=bin, scale=scale)
 
-    def display(self, data: pd.DataFrame, column: str, func: FuncT,
-                custom_widgets: dict[str, Any] = {}) -> None:
+    def display(self, data: pd.DataFrame, column: Union[str, Sequence[str]], func: FuncT,
+                custom_widgets: dict[str, Any] = {}, incremental: bool = False,
+                debounce: float = 0.25, cache_size: int = 16, asynchronous: bool = False,
+                directory: str = '.', url_prefix: str = '') -> None:
         """Generate interactive plot from widgets and interactive plot function.
 
         Args:
         data: Pandas dataframe.
-        column: column of data to be used for color binning.
-        func: chart plotting function.
+        column: column of data to be used for color binning, or a list of columns, between which a dropdown
+            (`self.column`) switches. The statistics of all of them, and the bins their charts first use
+            (see `StreamingData.precompute_bins`), are computed together, in one pass over the data; with
+            `incremental`, the data is written once for all of them, so that switching column sends only a
+            chart spec with a different colour field.
+        func: chart plotting function, which may be a coroutine function (`async def`).
         custom_widgets: dictionary of string name keys and widget values.
+        incremental: write `data` to a JSON file once, and have every chart refer to it by URL, so that
+            re-rendering a chart when a widget changes sends only the (small) chart spec to the front end,
+            and `append` only adds the new rows to the file. The file is removed by `close` (or at exit).
+        debounce: seconds to wait after a widget changes before re-rendering, so that a burst of changes
+            (e.g. typing into a text box) results in a single render; see `Debounced`.
+        cache_size: number of rendered charts to keep in `self.cache`, so that returning to an earlier
+            combination of widget values redisplays the chart without rebuilding or re-serialising it.
+        asynchronous: build and serialise each chart without blocking the kernel (and so the widgets):
+            awaiting `func`, if a coroutine function (which is always rendered this way), or else calling it
+            in a background thread. A placeholder is shown until the chart is ready, and a chart whose widget
+            values have since changed is discarded (although cached). Only with a running asyncio event loop
+            (as in Jupyter); otherwise charts are rendered as soon as the widgets change.
+        directory, url_prefix: with `incremental`, where to write the data file, and its URL as seen from
+            where the chart is displayed; see `DataFile`.
+
+        Rows can be appended to `data` later, with `append`.
+
+        Within an `instrument` context, each re-render records the time taken to serialise and display the
+        chart, and the latency of the whole interaction.
         """
-        def interact_func(**kwargs: Any) -> None:
-            """Interactive function that gets passed to widgets.interactive_output."""
-            # Use the WAYS widgets to generate the altair color object
-            color = self.get_altair_color_obj(data, column)
+        from ipywidgets import Layout, widgets
 
-            # Pass the data and color object into the chart func
-            display(func(data, color))
+        # Altair's json data transformer, applied once rather than for every chart
+        if self._data_file is not None:
+            self._data_file.remove()
+        self._data_file = DataFile(data, directory, url_prefix) if incremental else None
+        self._stream = StreamingData(data, column)
+        self._func, self._custom_widgets = func, custom_widgets
+        column_widgets = self._column_widgets()
+        self._asynchronous = asynchronous or inspect.iscoroutinefunction(func)
+        self.cache = ChartCache(cache_size)
 
         # Get a dictionary of the widgets to be passed to the interactive function
         controls = {'bin': self.bin,
@@ -303,6 +1279,10 @@ class AltairColorWidgets:
                     'color_3': self.color_3
                     }
 
+        # Re-render the plot into an output widget when any of the controls change
+        output = self._output = widgets.Output()
+        self.render = Debounced(self._render, wait=debounce)
+
         if custom_widgets:
             # Get a dictionary of the widgets to use as controls and add to the dictionary
             controls = custom_widgets | controls
@@ -312,37 +1292,224 @@ class AltairColorWidgets:
                                                   layout=Layout(grid_template_columns="repeat(3, 300px)")
                                                   )
 
-            # Use Jupyter widgets interactive_output to apply the control widgets to the interactive plot
-            display(custom_widgets_grid,
-                    self.bin_grid,
-                    self.scale_grid,
-                    widgets.interactive_output(interact_func, controls))
+            self._displayed = [*column_widgets,
+                               custom_widgets_grid,
+                               self.bin_grid,
+                               self.scale_grid,
+                               output]
         else:
-            display(self.bin_grid,
-                    self.scale_grid,
-                    widgets.interactive_output(interact_func, controls))
-        # Change the value of a widget so the plot auto-generates
-        # Note: for some reason doing this once instead of twice results in duplicate plots...
+            self._displayed = [*column_widgets,
+                               self.bin_grid,
+                               self.scale_grid,
+                               output]
+        display(*self._displayed)
+        for control in controls.values():
+            control.observe(self.render, names='value')
+        # Change the value of a widget so the widgets are initialised and the plot auto-generates (once)
         # TODO: may have to change this if there are scenarios where bin isn't used
-        self.bin.value = 'Continuous'
-        self.bin.value = 'Binned'
+        with self.render.hold():
+            self.bin.value = 'Continuous'
+            self.bin.value = 'Binned'
+
+    def _column_widgets(self) -> List[Any]:
+        """Create the dropdown (`self.column`) choosing the colour column, returning it if there is a choice.
+
+        Given a choice, the bins which the density chart and colour will first use for each column are
+        counted, all in one pass over the data.
+        """
+        from ipywidgets import widgets
+
+        stream = cast(StreamingData, self._stream)
+        self.column = widgets.Dropdown(options=stream.columns, description='Column')
+        self.column.observe(self._column_changed, names='value')
+        if len(stream.columns) == 1:
+            return []
+        bins = []
+        for column in stream.columns:
+            stats = stream.stats[column]
+            if stats.value_count > 0 and pd.api.types.is_number(stats.min):
+                # the extent as held by the extent widgets (see get_altair_color_obj), for a binned colour
+                # and its density chart, and the extent of the data, for the density chart of a continuous one
+                extent = [int(stats.min), int(stats.max)]
+                bins += [(column, alt.Bin(maxbins=self.maxbins.value, extent=extent)),
+                         (column, alt.Bin(maxbins=100, extent=extent)),
+                         (column, alt.Bin(maxbins=100))]
+        stream.precompute_bins(bins)
+        return [self.column]
+
+    def _column_changed(self, change: Any) -> None:
+        """Set the extent widgets to the extent of the newly chosen column, and re-render (once)."""
+        stats = cast(StreamingData, self._stream).stats[change.new]
+        with self.render.hold():
+            if stats.value_count > 0 and pd.api.types.is_number(stats.min):
+                self.extentmin.value = stats.min
+                self.extentmax.value = stats.max
+                self._data_extent = (self.extentmin.value, self.extentmax.value)
+            self.render()
+
+    def _chart_key(self) -> Tuple[pd.DataFrame, alt.Color, Hashable]:
+        """The data and colour object for the current widget values, and the cache key of their chart."""
+        data = cast(StreamingData, self._stream).data
+        # Use the WAYS widgets to generate the altair color object
+        color = self.get_altair_color_obj(data, self.column.value)
+        # The chart func can also depend on the custom widgets
+        custom_values = tuple((name, repr(widget.value)) for name, widget in self._custom_widgets.items())
+        return data, color, (data_fingerprint(data, self.column.value), repr(color), custom_values)
+
+    def _serialise(self, chart: alt.TopLevelMixin,
+                   data: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Rendered form of a chart of `data` (see `mimebundle`), referring to it by URL if `incremental`."""
+        if self._data_file is None:
+            return mimebundle(chart)
+        # refer to data by URL while the chart is serialised
+        with _transformer_lock:
+            default = alt.data_transformers.get()
+            shared = self._data_file.url_data
+            with alt.data_transformers.enable('ways_py_shared', source=data, shared=shared, default=default):
+                return mimebundle(chart)
+
+    def _cache(self, key: Hashable, rendered: Tuple[Dict[str, Any], Dict[str, Any]]) -> None:
+        # an empty bundle means that rendering failed
+        if rendered[0]:
+            self.cache.put(key, rendered)
+
+    def _show(self, rendered: Tuple[Dict[str, Any], Dict[str, Any]], start: Optional[float],
+              data: pd.DataFrame, cached: bool) -> None:
+        """Display a rendered chart, replacing the previous one; `start` is when the interaction started."""
+        # latency from the first widget change of the burst, so including any debounce delay
+        with _stage('interaction', start=start, rows=len(data), cached=cached):
+            self._output.clear_output(wait=True)
+            with self._output, _stage('display', rows=len(data)) as event:
+                display(rendered[0], metadata=rendered[1], raw=True)
+                if _listeners:
+                    event['bytes'] = _payload_size(rendered[0])
+
+    def _render(self) -> None:
+        """Render the chart for the current widget values, called (via self.render) when they change.
+
+        The chart is taken from the cache if it was already rendered, and otherwise built from the chart
+        function and serialised, either now or (if `asynchronous`) in a task.
+        """
+        start = self.render.requested
+        # supersede any chart still being built
+        self._generation += 1
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        data, color, key = self._chart_key()
+        rendered = self.cache.get(key)
+        cached = rendered is not None
+        if rendered is None:
+            loop = _running_loop() if self._asynchronous else None
+            if loop is not None:
+                self._output.clear_output(wait=True)
+                with self._output:
+                    display({'text/plain': "Rendering...", 'text/html': "<i>Rendering...</i>"}, raw=True)
+                self._task = loop.create_task(self._render_async(self._generation, start, data, color, key))
+                return
+            try:
+                chart = self._func(data, color)
+                if inspect.iscoroutine(chart):
+                    chart = asyncio.run(chart)
+                rendered = self._serialise(chart, data)
+            except Exception:
+                # shown in the output widget, as the caller (a widget observer, or the event loop for a
+                # debounced render) wouldn't show it
+                self._output.clear_output(wait=True)
+                with self._output:
+                    raise
+                return
+            self._cache(key, rendered)
+        self._show(rendered, start, data, cached)
+
+    async def _render_async(self, generation: int, start: Optional[float], data: pd.DataFrame,
+                            color: alt.Color, key: Hashable) -> None:
+        """Build and serialise a chart without blocking the event loop, and display it unless superseded.
+
+        The chart function, unless a coroutine function, and serialisation run in a background thread. The
+        chart of a superseded render is discarded once built (or, if already being serialised, once cached).
+        """
+        global _executor
+        loop = asyncio.get_running_loop()
+        if _executor is None:
+            # one thread for all widgets, so that chart functions (which may, e.g., enable an Altair theme,
+            # which is global) don't run concurrently with one another
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ways_py')
+        try:
+            if inspect.iscoroutinefunction(self._func):
+                chart = await self._func(data, color)
+            else:
+                chart = await loop.run_in_executor(_executor, self._func, data, color)
+            if generation != self._generation:
+                return
+            rendered = await loop.run_in_executor(_executor, self._serialise, chart, data)
+            self._cache(key, rendered)
+            if generation == self._generation:
+                self._task = None
+                self._show(rendered, start, data, cached=False)
+        except Exception:
+            if generation == self._generation:
+                self._task = None
+                # shown in the output widget, as the exception of a task would otherwise go unseen
+                self._output.clear_output(wait=True)
+                with self._output:
+                    raise
+
+    def append(self, rows: pd.DataFrame) -> None:
+        """Append a batch of rows to the data being displayed (see `display`), and re-render the chart.
+
+        The meta-visualisations are computed from running counts (see `StreamingData`), updated from the new
+        rows alone. With `incremental`, only the new rows are serialised and sent (added to the data file);
+        otherwise the chart embeds all of the rows, as usual. If the extent widgets hold the extent of the
+        data (as they do unless changed), and the new rows lie outside it, they are set to the new extent.
+        """
+        if self._stream is None:
+            raise RuntimeError("No data to append to: call display first.")
+        with _stage('append', rows=len(rows)):
+            before = self._stream.stats[self.column.value]
+            self._stream.append(rows)
+            if self._data_file is not None:
+                self._data_file.append(rows, self._stream.data)
+        with self.render.hold():
+            # extend an extent which was set from the data (see get_altair_color_obj) to the new data
+            after = self._stream.stats[self.column.value]
+            if after[:2] != before[:2] and (self.extentmin.value, self.extentmax.value) == self._data_extent:
+                self.extentmin.value = after.min
+                self.extentmax.value = after.max
+                self._data_extent = (self.extentmin.value, self.extentmax.value)
+            self.render()
+
+    def close(self) -> None:
+        """Close the widgets, and remove the data file written for `incremental` (see `display`)."""
+        for widget in self._displayed:
+            widget.close()
+        self._displayed = []
+        if self._data_file is not None:
+            self._data_file.remove()
+            self._data_file = None
 
 
 def altair_color_widgets(
-    custom_widgets: dict[str, Any] = {}
-) -> Callable[[FuncT], Callable[[Any, str], None]]:
+    custom_widgets: dict[str, Any] = {}, incremental: bool = False, debounce: float = 0.25,
+    cache_size: int = 16, asynchronous: bool = False, directory: str = '.', url_prefix: str = ''
+) -> Callable[[FuncT], Callable[[Any, Union[str, Sequence[str]]], None]]:
     """Widgets decorator for Altair colour binning, with option to add custom widgets.
 
     Args:
     custom_widgets: dictionary mapping names to widget values.
+    incremental, debounce, cache_size, asynchronous, directory, url_prefix: see `AltairColorWidgets.display`.
+
+    The decorated function takes the data and a column, or a list of columns to choose between.
     """
-    def decorator(func: FuncT) -> Callable[[Any, str], None]:
-        def wrapper(data: pd.DataFrame, column: str) -> None:
+    def decorator(func: FuncT) -> Callable[[Any, Union[str, Sequence[str]]], None]:
+        def wrapper(data: pd.DataFrame, column: Union[str, Sequence[str]]) -> None:
             if custom_widgets:
                 # Add each custom widget to the colour widgets class
                 for name, widget in custom_widgets.items():
                     setattr(AltairColorWidgets, name, widget)
             widgets = AltairColorWidgets()
-            widgets.display(data, column, func, custom_widgets=custom_widgets)
+            widgets.display(data, column, func, custom_widgets=custom_widgets,
+                            incremental=incremental, debounce=debounce, cache_size=cache_size,
+                            asynchronous=asynchronous, directory=directory, url_prefix=url_prefix)
         return wrapper
     return decorator